@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+""" Measures how much memory a loaded book takes, using a synthetic
+book so it can be run anywhere."""
+
+from argparse import ArgumentParser
+import codecs
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+
+from document_builder import PixelLineInfo
+from line_manager import LineManager
+from spell_checker import StubSpellChecker
+
+WORDS = u"the rains in spain fall mainly on plain l'homme qu'il \u00e9tait d\u00e9j\u00e0 l\u00e0".split()
+
+def make_book(book_dir, page_count, lines_per_page):
+    """ Writes page files into book_dir/text and their line
+    positions into book_dir/working/page_info, as the pipeline would."""
+    random.seed(page_count)
+    os.makedirs('{}/text'.format(book_dir))
+    os.makedirs('{}/working/page_info'.format(book_dir))
+    with open('{}/working/page_info/pages.csv'.format(book_dir), 'wb') as info:
+        for page_nbr in xrange(1, page_count + 1):
+            with codecs.open('{}/text/{}.txt'.format(book_dir, page_nbr), mode='w', encoding='utf-8') as f:
+                for idx in xrange(lines_per_page):
+                    f.write(u' '.join(random.choice(WORDS) for i in xrange(random.randint(6, 12))))
+                    f.write(u'\n')
+                    info.write('{},30,{},{},1400\n'.format(page_nbr, random.randint(90, 110), 100 + idx * 40))
+
+def deep_size(obj, seen):
+    """ Returns the bytes taken by obj and everything it refers to
+    that isn't in seen."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, unicode, int, long, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        for k, v in obj.iteritems():
+            size += deep_size(k, seen) + deep_size(v, seen)
+        return size
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_size(item, seen)
+        return size
+    if hasattr(obj, '__dict__'):
+        size += deep_size(obj.__dict__, seen)
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if hasattr(obj, slot):
+                size += deep_size(getattr(obj, slot), seen)
+    return size
+
+def max_rss():
+    """ Returns the peak resident memory of this process in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def memory(page_count, lines_per_page, build_words=False):
+    """ Loads a synthetic book and prints the bytes used per line."""
+    book_dir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        make_book(book_dir, page_count, lines_per_page)
+        os.chdir(book_dir)
+        spell_checker = StubSpellChecker(WORDS)
+        lm = LineManager(spell_checker, verbose=False)
+        rss = max_rss()
+        lm.load('text')
+        if build_words:
+            for page in lm.pages.values():
+                for line in page:
+                    line.build_words()
+        rss = max_rss() - rss
+        line_count = sum([len(page) for page in lm.pages.values()])
+        # the spell checker is shared, not per line
+        seen = set([id(spell_checker), id(lm.spell_checker)])
+        objects = deep_size(lm.pages, seen)
+        print '{} pages, {} lines'.format(page_count, line_count)
+        print 'objects:  {:>6} bytes per line'.format(objects/line_count)
+        print 'peak rss: {:>6} bytes per line'.format(rss/line_count)
+        print 'pixel line info: {} bytes'.format(deep_size(PixelLineInfo([255] * 100 + [0] * 1500), set()))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(book_dir)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Measures memory used by a loaded book.')
+    parser.add_argument('-pages', type=int,
+            default=5000,
+            help='Number of pages in the synthetic book')
+    parser.add_argument('-lines', type=int,
+            default=30,
+            help='Number of lines per page')
+    parser.add_argument('-words', type=bool,
+            default=False,
+            help='Also build the words of every line')
+    args = parser.parse_args()
+    memory(args.pages, args.lines, args.words)
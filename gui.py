@@ -6,12 +6,6 @@ import Image
 import wx
 import wx.lib.rcsizer as rcs
 
-try:
-    import aspell
-    CAN_ASPELL = True
-except ImportError:
-    CAN_ASPELL = False
-
 import document_builder
 import line_manager
 import spell_checker
@@ -45,7 +39,7 @@ class BaseFrame(wx.Frame):
         self.repeating = False
         self.errors = []
         self.skips = []
-        self.speller = None
+        self.spell_checker = None
         self.strict = False
 	# Make Panel
 	self.panel = wx.Panel(self, -1)
@@ -129,6 +123,7 @@ class BaseFrame(wx.Frame):
         self.update_line(self.page_nbr)
 
     def update_line(self, old_page_nbr):
+        self.lm.hold_line(self.page_nbr, self.line)
         self.errorsCtrl.SetValue(u', '.join(self.errors))
         if self.line:
 #           print self.line.line_nbr
@@ -162,9 +157,7 @@ class BaseFrame(wx.Frame):
         self.strict = strict
         if line_manager_:
             self.lm = line_manager_
-            if CAN_ASPELL:
-                self.spell_checker = line_manager_.spell_checker
-                self.speller = aspell.Speller('lang', line_manager_.spell_checker.lang)
+            self.spell_checker = line_manager_.spell_checker
             button_row = 2
             next_error_button = wx.Button(self.panel, wx.ID_ANY, label='Next Error', size=(90, 30))
             self.Bind(wx.EVT_BUTTON, self.OnNextBadLine, next_error_button)
@@ -193,7 +186,8 @@ class BaseFrame(wx.Frame):
             join_line_button.SetSize(join_line_button.GetBestSize())
             self.current_text.Add(join_line_button, row=button_row, col=1)
 
-            if self.speller:
+            # checkers with a dictionary to add to
+            if hasattr(self.spell_checker, 'add_word'):
                 button_row += 1
                 add_to_dictionary_button = wx.Button(self.panel, wx.ID_ANY, label='+ to Dict', size=(90, 30))
                 self.Bind(wx.EVT_BUTTON, self.OnAddToDict, add_to_dictionary_button)
@@ -220,8 +214,7 @@ class BaseFrame(wx.Frame):
         if self.line:
             errors = self.spell_checker.check_line(self.line.text)
             for word in errors:
-                self.speller.addtoPersonal(word)
-            self.speller.saveAllwords()
+                self.spell_checker.add_word(word)
             self.line.recheck()
             self.OnPreviousLine(None)
 
@@ -7,12 +7,6 @@ import Image
 import wx
 import wx.lib.rcsizer as rcs
 
-try:
-    import aspell
-    CAN_ASPELL = True
-except ImportError:
-    CAN_ASPELL = False
-
 import document_builder
 import line_manager
 import spell_checker
@@ -42,7 +36,7 @@ class BaseFrame(wx.Frame):
             for l in f:
                 self.words.append(l.split()[0])
         self.errors = []
-        self.speller = None
+        self.spell_checker = None
 	# Make Panel
 	self.panel = wx.Panel(self, -1)
         self.current_text = rcs.RowColSizer()
@@ -84,6 +78,7 @@ class BaseFrame(wx.Frame):
         return self.word
 
     def update_line(self, old_page_nbr):
+        self.lm.hold_line(self.page_nbr, self.line)
         self.errorsCtrl.SetValue(self.word)
         if self.line:
             if old_page_nbr != self.page_nbr:
@@ -101,10 +96,7 @@ class BaseFrame(wx.Frame):
     def set_line_manager(self, line_manager_):
         if line_manager_:
             self.lm = line_manager_
-            if CAN_ASPELL:
-                self.spell_checker = line_manager_.spell_checker
-                print line_manager_.spell_checker.lang
-                self.speller = aspell.Speller('lang', line_manager_.spell_checker.lang)
+            self.spell_checker = line_manager_.spell_checker
 
             next_error_button = wx.Button(self.panel, wx.ID_ANY, label='Next Error', size=(90, 30))
             self.Bind(wx.EVT_BUTTON, self.OnNextBadLine, next_error_button)
@@ -112,7 +104,8 @@ class BaseFrame(wx.Frame):
             next_error_button.SetSize(next_error_button.GetBestSize())
             self.current_text.Add(next_error_button, row=2, col=1)
 
-            if self.speller:
+            # checkers with a dictionary to add to
+            if hasattr(self.spell_checker, 'add_word'):
                 add_to_dictionary_button = wx.Button(self.panel, wx.ID_ANY, label='+ to Dict', size=(90, 30))
                 self.Bind(wx.EVT_BUTTON, self.OnAddToDict, add_to_dictionary_button)
                 add_to_dictionary_button.SetDefault()
@@ -122,8 +115,7 @@ class BaseFrame(wx.Frame):
             self.panel.SetSizerAndFit(self.current_text)
     def OnAddToDict(self, event):
         if self.word:
-            self.speller.addtoPersonal(self.word)
-            self.speller.saveAllwords()
+            self.spell_checker.add_word(self.word)
         self.OnNextBadLine(None)
 
 def pil_image_to_scaled_image(pil_image, desired_width):
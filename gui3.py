@@ -119,6 +119,7 @@ class BaseFrame(wx.Frame):
             self.OnNextLine(None)
  
     def update_line(self, old_page_nbr):
+        self.lm.hold_line(self.page_nbr, self.line)
         if self.line:
             if old_page_nbr != self.page_nbr:
                 self.page_image = Image.open('images/pages/{}.pbm'.format(self.page_nbr))
@@ -114,6 +114,7 @@ class BaseFrame(wx.Frame):
         self.update_line(old_page_nbr)
 
     def update_line(self, old_page_nbr):
+        self.lm.hold_line(self.page_nbr, self.line)
         self.errorsCtrl.SetValue(' '.join(self.possible_proper_nouns))
         if self.line:
             if old_page_nbr != self.page_nbr:
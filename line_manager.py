@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 """ This module handles all of the management of lines in a scanned book."""
 
-from collections import Counter, defaultdict
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict, OrderedDict
 import codecs
 from ConfigParser import NoOptionError
 import csv
@@ -46,6 +47,9 @@ class LineManager(object):
         self.start_page = start_page
         self.end_page = end_page
         self.verbose = verbose
+        self.page_sizes = None
+        self.line_order = None
+        self.diagnostics = {}
 
     def remove_headers(self, header):
         """ Goes through the first rows until it finds
@@ -78,9 +82,13 @@ class LineManager(object):
                 else:
                     i += 1
 
-    def load(self, raw_file_dir):
-        """ Creates lines out of all the lines in a directory."""
-        line_infos = defaultdict(lambda:[])
+    def load(self, raw_file_dir, lazy=False, max_pages=50):
+        """ Creates lines out of all the lines in a directory.
+
+        If lazy, only notes which pages there are: pages are read
+        when first used and at most max_pages unchanged ones are
+        kept in memory."""
+        self.line_infos = line_infos = defaultdict(lambda:[])
         if os.path.exists('working/page_info'):
             for filename in os.listdir('working/page_info'):
                 if filename.endswith('.csv'):
@@ -93,7 +101,7 @@ class LineManager(object):
                             line_info.left_margin = int(row[2])
                             line_info.width = int(row[4])
                             line_infos[row[0]].append(line_info)
-        headers = set()
+        self.headers = headers = set()
         if os.path.exists('working/headers.txt'):
             with open('working/headers.txt', 'rb') as f:
                 for l in f:
@@ -103,6 +111,7 @@ class LineManager(object):
                         pass
 
 
+        page_files = OrderedDict()
         for fn in sorted(os.listdir(raw_file_dir), key=lambda x: int(os.path.splitext(x)[0])):
             
 	    basename, ext = os.path.splitext(fn)
@@ -111,18 +120,109 @@ class LineManager(object):
 
             if self.end_page > 0 and int(basename) > self.end_page:
                 break
-            with codecs.open('{}/{}'.format(raw_file_dir, fn), mode='r', encoding='utf-8') as f:
-                if self.verbose:
-                    print 'Loading page {:>3}'.format(basename)
-                self.pages[basename] = Page(basename, fn in headers, line_infos[basename])
-                idx = 1
-                for l in f:
-                    line = Line(l.strip(), idx, self.spell_checker)
-                    self.pages[basename].append(line)
-                    idx += 1
-        self.average_length = self.calculate_average_length()
-        self.average_lines_per_page = sum([len(lines) for lines in self.pages.values()])/len(self.pages)
-        self.page_numbers = sorted(self.pages.keys(), key=lambda x: int(x))
+            page_files[basename] = '{}/{}'.format(raw_file_dir, fn)
+        self.page_sizes = []
+        if lazy:
+            total = 0
+            for path in page_files.values():
+                with codecs.open(path, mode='r', encoding='utf-8') as f:
+                    lengths = [len(l.strip()) for l in f]
+                self.page_sizes.append(len(lengths))
+                total += sum(lengths)
+            self.pages = PageCache(self, page_files, max_pages)
+            try:
+                self.average_length = total/sum(self.page_sizes)
+            except ZeroDivisionError:
+                self.average_length = 0
+        else:
+            self.pages = {}
+            ordinal = 0
+            for page_nbr, path in page_files.items():
+                self.pages[page_nbr] = self.read_page(page_nbr, path, ordinal)
+                self.page_sizes.append(len(self.pages[page_nbr]))
+                ordinal += self.page_sizes[-1]
+            self.average_length = self.calculate_average_length()
+        self.average_lines_per_page = sum(self.page_sizes)/len(self.pages)
+        self.page_numbers = page_files.keys()
+        self.line_order = None
+
+    def read_page(self, page_nbr, path, first_ordinal=None):
+        """ Returns a Page of the lines in a page file, numbered
+        from first_ordinal."""
+        with codecs.open(path, mode='r', encoding='utf-8') as f:
+            if self.verbose:
+                print 'Loading page {:>3}'.format(page_nbr)
+            page = Page(page_nbr, os.path.basename(path) in self.headers, self.line_infos[page_nbr], first_ordinal)
+            idx = 1
+            for l in f:
+                line = Line(l.strip(), idx, self.spell_checker)
+                line.line_manager = self
+                page.append(line)
+                idx += 1
+        return page
+
+    def ordered_lines(self):
+        """ Returns the BookLines of the book, (page_nbr, line) for
+        every line in book order."""
+        if self.line_order is None:
+            page_sizes = self.page_sizes
+            if page_sizes is None:
+                page_sizes = [len(self.pages[page_nbr]) for page_nbr in self.page_numbers]
+            self.line_order = BookLines(self.pages, self.page_numbers, page_sizes)
+            self.diagnostics = {}
+        return self.line_order
+
+    def ordinal(self, line):
+        """ Returns the line's place in the book, or None if it
+        isn't one of this book's lines."""
+        lines = self.ordered_lines()
+        try:
+            if line.same_as(lines[line.ordinal][1]):
+                return line.ordinal
+        except (AttributeError, IndexError, TypeError):
+            pass
+        return None
+
+    def start_position(self, start_page_nbr, start_line):
+        """ Returns the position of the first line after start_line,
+        or of the first line of start_page_nbr if there is no line."""
+        lines = self.ordered_lines()
+        if start_page_nbr and start_line:
+            pos = self.ordinal(start_line)
+            if pos is None:
+                return len(lines)
+            return pos + 1
+        return lines.page_start(int(start_page_nbr or 0))
+
+    def flagged_lines(self, name, check):
+        """ Returns the FlaggedLines index for a diagnostic,
+        check (taking a line) being how it is made."""
+        self.ordered_lines()
+        if name not in self.diagnostics:
+            self.diagnostics[name] = FlaggedLines(check)
+        return self.diagnostics[name]
+
+    def hold_line(self, page_nbr, line):
+        """ Notes the line being worked on (e.g. the one a gui shows),
+        so its page stays in memory until it is edited or let go.
+        A line of None lets it go."""
+        if isinstance(self.pages, PageCache):
+            self.pages.held = page_nbr if line is not None else None
+
+    def line_changed(self, line):
+        """ Rechecks an edited line for every diagnostic."""
+        if not self.diagnostics:
+            return
+        pos = self.ordinal(line)
+        if pos is None:
+            return
+        for index in self.diagnostics.values():
+            index.update(pos, line)
+
+    def lines_changed(self):
+        """ Forgets all diagnostics after lines have been edited
+        in bulk."""
+        self.diagnostics = {}
 
     def calculate_average_length(self):
         """ Returns the average length (int) of all valid lines."""
@@ -140,32 +240,22 @@ class LineManager(object):
             return 0
 
     def previous_line(self, start_page_nbr, start_line):
-        hold_line = None
-        lines = self.pages[start_page_nbr]
-        for line in lines:
-            if line == start_line:
-                if hold_line:
-                    return start_page_nbr, hold_line
-                elif self.pages.has_key(str(int(start_page_nbr) - 1)):
-                    page_nbr = str(int(start_page_nbr) - 1)
-                    return page_nbr, self.pages[page_nbr].lines[-1]
-                else:
-                    return start_page_nbr, start_line
-            else:
-                hold_line = line
-        return start_page_nbr, start_line
+        page = self.pages[start_page_nbr]
+        if not page.holds(start_line):
+            return start_page_nbr, start_line
+        if start_line.offset > 0:
+            return start_page_nbr, page.lines[start_line.offset - 1]
+        elif self.pages.has_key(str(int(start_page_nbr) - 1)):
+            page_nbr = str(int(start_page_nbr) - 1)
+            return page_nbr, self.pages[page_nbr].lines[-1]
+        else:
+            return start_page_nbr, start_line
         
     def next_line(self, start_page_nbr, start_line):
-        found = not bool(start_page_nbr and start_line)
-        for page_nbr in self.page_numbers:
-            if int(page_nbr) < int(start_page_nbr):
-                continue
-            lines = self.pages[page_nbr]
-            for line in lines:
-                if found:
-                    return page_nbr, line
-                elif line == start_line:
-                    found = True
+        lines = self.ordered_lines()
+        pos = self.start_position(start_page_nbr, start_line)
+        if pos < len(lines):
+            return lines[pos]
         return '0', None
         
     def next_line_to_check(self, start_page_nbr, start_line, log_bad=False, strict=False, skips=[]):
@@ -173,18 +263,20 @@ class LineManager(object):
             page_nbr and line that should be checked and error list.
 
         Starts at beginning if page or line blank."""
-        found = not bool(start_page_nbr and start_line)
-        for page_nbr in self.page_numbers:
-            if int(page_nbr) < int(start_page_nbr):
-                continue
-            lines = self.pages[page_nbr]
-            for line in lines:
-                if found:
-                    errors = [error for error in line.should_check(log_bad, strict) if error not in skips]
-                    if errors:
-                        return page_nbr, line, errors
-                elif line == start_line:
-                    found = True
+        lines = self.ordered_lines()
+        index = self.flagged_lines(
+            'strict' if strict else 'words',
+            lambda line: bool(line.should_check(strict=strict)))
+        pos = index.next(lines, self.start_position(start_page_nbr, start_line))
+        while pos is not None:
+            page_nbr, line = lines[pos]
+            to_check = line.should_check(log_bad, strict)
+            if not to_check:
+                index.update(pos, line)
+            errors = [error for error in to_check if error not in skips]
+            if errors:
+                return page_nbr, line, errors
+            pos = index.next(lines, pos + 1)
         return '0', None, []
 
     def next_proper_noun(self, start_page_nbr, start_line, skip_list, abbreviations):
@@ -193,7 +285,6 @@ class LineManager(object):
         returns page nbr, line with proper nouns, and list of
         proper nouns.
         """
-        found = not bool(start_page_nbr and start_line)
         proper_nouns = []	
         try:
             hold_words = start_line.text.split()[-2:]
@@ -201,20 +292,17 @@ class LineManager(object):
         except AttributeError:
             hold_line = ''
             hold_words = [''] 
-        for page_nbr in self.page_numbers:
-            if int(page_nbr) < int(start_page_nbr):
-                continue
-            lines = self.pages[page_nbr]
-            for line in lines:
-                if found:
-                    line_text = line.text
-                    if skip_list and abbreviations:
-                        sample_proper = skip_list.pop()
-                        skip_list.add(sample_proper)
-                        for abbreviation in abbreviations:
-                            line_text = line_text.replace(abbreviation, sample_proper)
-                    to_check = u'{} {}'.format(hold_line, line_text)
-                    proper_nouns.extend([w for w in self.spell_checker.odd_punctuation(line_text)])
+        lines = self.ordered_lines()
+        for pos in xrange(self.start_position(start_page_nbr, start_line), len(lines)):
+            page_nbr, line = lines[pos]
+            line_text = line.text
+            if skip_list and abbreviations:
+                sample_proper = skip_list.pop()
+                skip_list.add(sample_proper)
+                for abbreviation in abbreviations:
+                    line_text = line_text.replace(abbreviation, sample_proper)
+            to_check = u'{} {}'.format(hold_line, line_text)
+            proper_nouns.extend([w for w in self.spell_checker.odd_punctuation(line_text)])
 #                   for word in line.text.split(): 
 #                       
 #                       if self.spell_checker.strip_garbage(word) not in skip_list:
@@ -225,38 +313,34 @@ class LineManager(object):
 #                               hold_words = [hold_words.pop(), word,]
 #                           except IndexError:
 #                               hold_words = [word,]
-                    caps = self.spell_checker.proper_nouns(to_check)
-                    for cap in caps:
-                        if cap not in skip_list and cap in line.text:
-                            proper_nouns.append(cap)
-                    bad_lowers = self.spell_checker.lower_after_sentence(to_check)
-                    for bl in bad_lowers:
-                        if bl in line.text:
-                            proper_nouns.append(bl)
-                    if proper_nouns:
-                        return page_nbr, line, proper_nouns
-                    if line_text.strip():
-                        hold_line = line_text.strip()
-                elif line == start_line:
-                    found = True
+            caps = self.spell_checker.proper_nouns(to_check)
+            for cap in caps:
+                if cap not in skip_list and cap in line.text:
+                    proper_nouns.append(cap)
+            bad_lowers = self.spell_checker.lower_after_sentence(to_check)
+            for bl in bad_lowers:
+                if bl in line.text:
+                    proper_nouns.append(bl)
+            if proper_nouns:
+                return page_nbr, line, proper_nouns
+            if line_text.strip():
+                hold_line = line_text.strip()
         return '0', None, proper_nouns
     def next_value(self, pattern_string, start_page_nbr, start_line):
         """ Searches for a pattern in the lines after page nbr/line.
 
         returns page_nbr and line or 0,None."""
-        pattern = re.compile(pattern_string, flags=re.UNICODE)
-        found = not bool(start_page_nbr and start_line)
-        for page_nbr in self.page_numbers:
-            if int(page_nbr) < int(start_page_nbr):
-                continue
-            lines = self.pages[page_nbr]
-            for line in lines:
-                if found:
-                    m = pattern.search(line.text)
-                    if m:
-                        return page_nbr, line, (m.group(),)
-                elif line == start_line:
-                    found = True
+        search = re.compile(pattern_string, flags=re.UNICODE).search
+        lines = self.ordered_lines()
+        index = self.flagged_lines(('value', pattern_string,), lambda line: bool(search(line.text)))
+        pos = index.next(lines, self.start_position(start_page_nbr, start_line))
+        while pos is not None:
+            page_nbr, line = lines[pos]
+            m = search(line.text)
+            if m:
+                return page_nbr, line, (m.group(),)
+            index.update(pos, line)
+            pos = index.next(lines, pos + 1)
         return '0', None, []
         
     def find_word(self, word):
@@ -278,19 +362,17 @@ class LineManager(object):
         before_line = Line('[PAGE BEGIN]', 0, self.spell_checker)
         after_line = Line('[PAGE END]', len(self.pages[page_nbr].lines), self.spell_checker)
         idx = 0
-        lines = self.pages[page_nbr].lines
-        try:
-            idx = lines.index(check_line)
+        page = self.pages[page_nbr]
+        if page.holds(check_line):
+            idx = check_line.offset
             if idx > 0:
-                before_line = lines[idx-1]
+                before_line = page.lines[idx-1]
             else:
                 before_line.line_info = check_line.line_info
             try:
-                after_line = lines[idx+1]
+                after_line = page.lines[idx+1]
             except IndexError:
                 after_line.line_info = check_line.line_info
-        except ValueError:
-            pass
         return before_line, after_line, idx
 
     def interactive_fix(self):
@@ -359,6 +441,7 @@ class LineManager(object):
                             if replacement:
                                 word.text = replacement.decode('utf-8')
             line.rebuild()
+            self.line_changed(line)
             page_nbr, line = self.next_line_to_check(self.start_page, line)
 
     def write_html(self, book_config, last_page, last_line):
@@ -416,8 +499,10 @@ class LineManager(object):
                 return
             if self.verbose:
                 print 'writing page {}'.format(page_nbr)
+            # read before the file is truncated, as it may be the source
+            page = self.pages[page_nbr]
             with codecs.open('{}/{}.txt'.format(clean_file_dir, page_nbr), mode='w', encoding='utf-8') as f:
-                for line in self.pages[page_nbr]:
+                for line in page:
                     if line.valid:
                         if line.manual_fix:
                             f.write('# FIX ME {}\n'.format(line.manual_fix))
@@ -425,6 +510,7 @@ class LineManager(object):
                         f.write('\n')
 
     def join_lines(self):
+        self.lines_changed()
         last_line = None
         for page_nbr in self.page_numbers:
             if int(page_nbr) < self.start_page:
@@ -442,6 +528,7 @@ class LineManager(object):
                         last_line = line
 
     def fix_lines(self):
+        self.lines_changed()
         for page_nbr in self.page_numbers:
             if int(page_nbr) < self.start_page:
                 continue
@@ -453,14 +540,21 @@ class LineManager(object):
                 print 'fixing page {:>3}'.format(page_nbr)
             for line in self.pages[page_nbr]:
                 if line.valid:
+                    self.spell_checker.set_location(page_nbr, line.line_nbr)
                     line.fix()
+            self.spell_checker.clear_location()
 
     def quick_fix(self):
-        """ Replaces all the must-replace characters."""
+        """ Replaces all the must-replace characters,
+        a page at a time."""
+        self.lines_changed()
         for page_nbr in self.page_numbers:
-            for line in self.pages[page_nbr]:
-                if line.valid:
-                    line.text = self.spell_checker.quick_fix(line.text)
+            lines = [line for line in self.pages[page_nbr] if line.valid]
+            texts = self.spell_checker.quick_fix_lines(
+                [line.text for line in lines],
+                [(page_nbr, line.line_nbr,) for line in lines])
+            for line, text in zip(lines, texts):
+                line.text = text
 
     def fix_hyphen(self, lines):
         if not lines[0] or not lines[1]:
@@ -475,17 +569,24 @@ class LineManager(object):
                 
 class Line(object):
     """ Manages individual lines of a book. """
+    __slots__ = ('raw_text', 'text', 'line_nbr', 'ordinal', 'offset', 'valid',
+        'spell_checker', 'words', '_built', 'manual_fix', 'line_info', 'line_manager',)
+
     def __init__(self, raw_text, line_nbr, spell_checker):
         self.raw_text = raw_text
         self.text = raw_text
         self.line_nbr = line_nbr
+        self.ordinal = None
+        self.offset = None
         self.valid = True
-        self.null_word = Word('', spell_checker, True)
         self.spell_checker = spell_checker
-	self.words = []
+        # no words until built
+	self.words = ()
         self._built = False
         self.manual_fix = False
 	self.line_info = None
+        # told when the line is edited, if it is one of its lines
+        self.line_manager = None
 
     def should_check(self, log_bad=False, strict=False):
         """ Returns a list of words that should be checked."""
@@ -509,16 +610,29 @@ class Line(object):
                     f.write(u'{}\n'.format(w))
         return to_check
 
+    def same_as(self, other):
+        """ Returns whether other is this line, or this line read
+        again after its page was dropped from memory."""
+        return other is self or (self.ordinal is not None and
+            other.ordinal == self.ordinal and other.raw_text == self.raw_text)
+
     def recheck(self):
         self._built = False
-        self.words = []
+        self.words = ()
         self.build_words()
+        self.changed()
 
     def set_text(self, text, quick_fix=True):
         self.text = text
         self._built = False
-        self.words = []
+        self.words = ()
         self.rebuild(False)
+        self.changed()
+
+    def changed(self):
+        """ Lets the line manager recheck the line for its diagnostics."""
+        if self.line_manager is not None:
+            self.line_manager.line_changed(self)
 
     def rebuild(self, quick_fix=True):
         self.build_words(quick_fix=quick_fix)
@@ -529,8 +643,7 @@ class Line(object):
             return
         
         already_spell_checked = skip_spell_check or not self.spell_checker.check_line(self.text)
-	for w in self.text.split():
-            self.words.append(Word(w, self.spell_checker, already_spell_checked, quick_fix))
+	self.words = [Word(w, self.spell_checker, already_spell_checked, quick_fix) for w in self.text.split()]
         self._built = True
         self.rebuild()
 
@@ -553,6 +666,7 @@ class Line(object):
         """ For joining hyphens, removes last word of line."""
         words = self.text.split()
         self.text = u' '.join(words[:-1])
+        self.changed()
         return words[-1]
 
     def replace_first_word(self, word):
@@ -560,12 +674,12 @@ class Line(object):
         words = self.text.split()
         words[0] = word
         self.text = u' '.join(words)
+        self.changed()
 
     def has_odd_punctuation(self):
         """ Returns a boolean if matches any bad punctuation."""
-        for w in self.text.split():
-            word = Word(w, self.spell_checker)
-            if word.odd_punctuation:
+        for w in self.spell_checker.quick_fix_lines(self.text.split()):
+            if self.spell_checker.odd_punctuation_findings(w):
                 return True
         return False  
 
@@ -603,12 +717,154 @@ class SubstitutionManager(object):
 class NoWordException(Exception):
     pass
 
+class BookLines(object):
+    """ The lines of a book in order, as (page_nbr, line).
+
+    Lines are found through the page they are on, so only that
+    page needs to be loaded."""
+    def __init__(self, pages, page_numbers, page_sizes):
+        self.pages = pages
+        self.page_numbers = page_numbers
+        self.page_ints = [int(page_nbr) for page_nbr in page_numbers]
+        self.page_offsets = []
+        self.total = 0
+        for size in page_sizes:
+            self.page_offsets.append(self.total)
+            self.total += size
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, pos):
+        if pos < 0 or pos >= self.total:
+            raise IndexError(pos)
+        idx = bisect_right(self.page_offsets, pos) - 1
+        page_nbr = self.page_numbers[idx]
+        line = self.pages[page_nbr].lines[pos - self.page_offsets[idx]]
+        line.ordinal = pos
+        return page_nbr, line
+
+    def page_start(self, page_int):
+        """ Returns the position of the first line of the first
+        page numbered page_int or more."""
+        idx = bisect_left(self.page_ints, page_int)
+        if idx < len(self.page_offsets):
+            return self.page_offsets[idx]
+        return self.total
+
+class PageCache(object):
+    """ The pages of a book, read from their files when first used.
+
+    Stands in for LineManager's dict of pages. Only the max_pages
+    most recently used pages are kept, except that pages with
+    changed lines (pinned) and the page of the line being worked
+    on (held, see LineManager.hold_line) are kept so no edit is lost."""
+    def __init__(self, line_manager, page_files, max_pages=50):
+        self.line_manager = line_manager
+        self.page_files = page_files
+        self.first_ordinals = {}
+        ordinal = 0
+        for page_nbr, size in zip(page_files.keys(), line_manager.page_sizes):
+            self.first_ordinals[page_nbr] = ordinal
+            ordinal += size
+        self.max_pages = max_pages
+        # least recently used first
+        self.loaded = OrderedDict()
+        self.pinned = {}
+        self.held = None
+
+    def __getitem__(self, page_nbr):
+        page = self.pinned.get(page_nbr)
+        if page is not None:
+            return page
+        try:
+            page = self.loaded.pop(page_nbr)
+        except KeyError:
+            page = self.line_manager.read_page(page_nbr, self.page_files[page_nbr], self.first_ordinals.get(page_nbr))
+        self.loaded[page_nbr] = page
+        if len(self.loaded) > self.max_pages:
+            self.evict()
+        return page
+
+    def evict(self):
+        """ Drops the least recently used pages until no more than
+        max_pages are left (the latest always stays). Changed pages
+        are pinned instead, and the held one is kept as if just used."""
+        for _ in xrange(len(self.loaded) - 1):
+            if len(self.loaded) <= self.max_pages:
+                break
+            page_nbr, page = self.loaded.popitem(last=False)
+            if page.modified():
+                self.pinned[page_nbr] = page
+            elif page_nbr == self.held:
+                self.loaded[page_nbr] = page
+
+    def __contains__(self, page_nbr):
+        return page_nbr in self.page_files
+
+    def has_key(self, page_nbr):
+        return page_nbr in self.page_files
+
+    def __len__(self):
+        return len(self.page_files)
+
+    def __iter__(self):
+        return iter(self.page_files)
+
+    def keys(self):
+        return self.page_files.keys()
+
+    def values(self):
+        for page_nbr in self.page_files:
+            yield self[page_nbr]
+
+    def items(self):
+        for page_nbr in self.page_files:
+            yield page_nbr, self[page_nbr]
+
+class FlaggedLines(object):
+    """ Positions of the lines a diagnostic flags, sorted.
+
+    Lines are checked as far as anyone has looked and no further:
+    every line before scanned has been checked, so the next flagged
+    line is a binary search away unless it is past there."""
+    def __init__(self, check):
+        self.check = check
+        self.flagged = []
+        self.scanned = 0
+
+    def next(self, lines, start):
+        """ Returns the position of the first flagged line at or
+        after start, or None if there are none."""
+        idx = bisect_left(self.flagged, start)
+        if idx < len(self.flagged):
+            return self.flagged[idx]
+        for pos in xrange(max(start, self.scanned), len(lines)):
+            self.scanned = pos + 1
+            if self.check(lines[pos][1]):
+                self.flagged.append(pos)
+                return pos
+        return None
+
+    def update(self, pos, line):
+        """ Rechecks the line at pos if it has been checked."""
+        if pos >= self.scanned:
+            return
+        idx = bisect_left(self.flagged, pos)
+        listed = idx < len(self.flagged) and self.flagged[idx] == pos
+        if self.check(line):
+            if not listed:
+                self.flagged.insert(idx, pos)
+        elif listed:
+            del self.flagged[idx]
+
 class Page(object):
-    def __init__(self, nbr, has_header=False, line_infos=[]):
+    def __init__(self, nbr, has_header=False, line_infos=[], first_ordinal=None):
         self.number = nbr
         self.lines = []
         self.has_header = has_header
         self.line_infos = line_infos
+        self.first_ordinal = first_ordinal
 
     def find_word(self, word):
         """ Returns line and line info that contain this word.
@@ -628,6 +884,13 @@ class Page(object):
                 return line, line_info
         raise NoWordException()
 
+    def holds(self, line):
+        """ Returns whether the line is on this page."""
+        try:
+            return line.same_as(self.lines[line.offset])
+        except (AttributeError, IndexError, TypeError):
+            return False
+
     def __iter__(self):
         return self.lines.__iter__()
 
@@ -644,11 +907,24 @@ class Page(object):
             print 'index error', len(self.line_infos), len(self.lines)
             if self.line_infos:
                 line.line_info = self.line_infos[-1]
+        line.offset = len(self.lines)
+        if self.first_ordinal is not None:
+            line.ordinal = self.first_ordinal + line.offset
         self.lines.append(line)
 
+    def modified(self):
+        """ Returns whether any line differs from the page file."""
+        for line in self.lines:
+            if line.text != line.raw_text or not line.valid or line.manual_fix:
+                return True
+        return False
+
 
 class Word(object):
     """ Actually, the holder of a space-separated chunk of text."""
+    __slots__ = ('raw_text', 'text', 'spell_checker', 'checked',
+        'misspelled', 'odd_punctuation', 'hyphenated',)
+
     def __init__(self, raw_text, spell_checker, already_spell_checked=False, quick_fix=True):
         self.raw_text = raw_text
         self.text = raw_text
@@ -740,8 +1016,8 @@ class Word(object):
             if not self.spell_checker.check_line(new_word):
                 self.spell_checker.log_fix('cross_line_fix', 'join_all',
                     u'{} {}'.format(word.text, self.text), new_word)
-                self.mispelled = False
-                word.mispelled = False
+                self.misspelled = False
+                word.misspelled = False
                 self.text = new_word
                 word.text = ''
                 return
@@ -750,8 +1026,8 @@ class Word(object):
             if not self.spell_checker.check_line(new_word):
                 self.spell_checker.log_fix('cross_line_fix', 'join_truncated',
                     u'{} {}'.format(word.text, self.text), new_word)
-                self.mispelled = False
-                word.mispelled = False
+                self.misspelled = False
+                word.misspelled = False
                 self.text = new_word
                 word.text = ''
                 return
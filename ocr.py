@@ -5,6 +5,7 @@ from collections import Counter
 from ConfigParser import ConfigParser, NoOptionError
 import csv
 import Image
+from multiprocessing import cpu_count
 import os
 import re
 import shutil
@@ -118,20 +119,20 @@ def proper_names():
     db = document_builder.SpellcheckDocMaker(checker)
     db.make_possible_proper_name_doc('text/clean')
     
-def cross_line_fixes():
+def cross_line_fixes(workers=1):
     lang = get_lang()
-    checker = spell_checker.AspellSpellChecker(lang)
-    db = document_builder.SpellcheckDocMaker(checker)
+    checker = spell_checker.AspellSpellChecker(lang, word_list_path=word_list_path(lang))
+    db = document_builder.SpellcheckDocMaker(checker, workers=workers)
     db.make_line_join_doc('text/clean')
 
-def fix_spells():
+def fix_spells(workers=1):
     """ Runs through the document, finds all the bad words, then 
     tries to find fixed versions of them.
     """
     lang = get_lang()
-    checker = spell_checker.AspellSpellChecker(lang)
+    checker = spell_checker.AspellSpellChecker(lang, word_list_path=word_list_path(lang))
 
-    db = document_builder.SpellcheckDocMaker(checker)
+    db = document_builder.SpellcheckDocMaker(checker, workers=workers)
     db.make_word_fix_doc('text/clean')
 
 def run_gui2():
@@ -140,7 +141,7 @@ def run_gui2():
     lm = line_manager.LineManager(
         spell_checker.AspellSpellChecker(lang)
         )
-    lm.load('text/clean')
+    lm.load('text/clean', lazy=True)
     gui2.main(lm)
 
 def run_gui3():
@@ -156,7 +157,7 @@ def run_gui3():
         spell_checker.AspellSpellChecker(lang),
         start_page
         )
-    lm.load('text/clean')
+    lm.load('text/clean', lazy=True)
     app = gui3.main(lm)
     last_page = int(app.last_html_page)
     last_line = app.last_html_line
@@ -181,7 +182,7 @@ def run_gui4():
         spell_checker.AspellSpellChecker(lang),
         start_page
         )
-    lm.load('text/clean')
+    lm.load('text/clean', lazy=True)
     app = gui4.main(lm)
     lm.write_pages('text/clean', False)
     last_page = int(app.last_page)
@@ -198,7 +199,7 @@ def run_dpgui():
     lm = line_manager.LineManager(
         spell_checker.AspellSpellChecker(lang, './dict.{}.pws'.format(lang))
         )
-    lm.load('text/clean')
+    lm.load('text/clean', lazy=True)
     dpgui.main(lm)
     lm.write_pages('text/clean', False)
 
@@ -225,7 +226,7 @@ def run_gui(input_start_page, end_page, strict):
         start_page,
         end_page
         )
-    lm.load('text/clean')
+    lm.load('text/clean', lazy=True)
     app = gui.main(lm, strict)
     lm.write_pages('text/clean', False)
 
@@ -460,25 +461,74 @@ def clean(start_page, end_page):
             pass
     lm.write_pages('text/clean', False)
 
-def extract_images(tiffs, verbose):
+def extract_images(tiffs, verbose, workers=None):
     if tiffs:
-        pdf_processor = process_pdf.TiffProcessor(verbose)
+        pdf_processor = process_pdf.TiffProcessor(verbose, workers)
     else:
-        pdf_processor = process_pdf.PdfProcessor(verbose)
+        pdf_processor = process_pdf.PdfProcessor(verbose, workers)
     pdf_processor.extract_images_from_pdfs()
     pdf_processor.extract_pages_from_images()
     
-def extract_text(verbose):
+def extract_text(verbose, workers=None):
     lang = get_lang()
     tesseract_lang = aspell_lang_to_tesseract_lang(lang)
-    pdf_processor = process_pdf.PdfProcessor(verbose)
+    pdf_processor = process_pdf.PdfProcessor(verbose, workers)
     pdf_processor.extract_text_from_pages(tesseract_lang)
 
-def extract_pdf(verbose):
-    pdf_processor = process_pdf.PdfProcessor(verbose)
+def pipeline(tiffs, verbose, workers=None):
+    """ Streams each page through image extraction, cropping, ocr,
+    header removal, quick fixes and page info, starting on a page's
+    next stage as soon as the one before is done with it. Pages
+    already through a stage on an earlier run skip it."""
+    lang = get_lang()
+    if tiffs:
+        pdf_processor = process_pdf.TiffProcessor(verbose, workers)
+    else:
+        pdf_processor = process_pdf.PdfProcessor(verbose, workers)
+    checker = spell_checker.AspellSpellChecker(lang)
+    db = document_builder.SpellcheckDocMaker(checker)
+    # headers can only be removed once they have been checked by hand,
+    # and quick fixes would keep them from matching, so until then
+    # pages are left as read for clean
+    header_maps = None
+    if os.path.exists('working/headers.txt') and os.path.exists('working/footers.txt'):
+        header_maps = db.header_maps()
+    for page in pdf_processor.stream_text_from_pdfs(aspell_lang_to_tesseract_lang(lang)):
+        if header_maps and not page.cleaned:
+            clean_text_file = 'text/clean/{}.txt'.format(page.page_nbr)
+            db.remove_page_headers(clean_text_file, *header_maps)
+            _quick_fix_page(checker, page.page_nbr, clean_text_file)
+            page.cleaned = True
+        if page.new or not os.path.exists('working/page_info/{}.csv'.format(page.page_nbr)):
+            db.write_page_info(str(page.page_nbr), page.raw_text_file, 'images/pages/{}.pbm'.format(page.page_nbr))
+        if verbose:
+            print 'Page {} is done'.format(page.page_nbr)
+    if header_maps:
+        # same as the first clean
+        config = ConfigParser()
+        config.read('book.cnf')
+        if not config.has_section('process'):
+            config.add_section('process')
+        config.set('process', 'clean_headers', 'false')
+        with open('book.cnf', 'wb') as f:
+            config.write(f)
+    else:
+        possible_headers()
+        print 'Check working/headers.txt and working/footers.txt, then run clean'
+
+def _quick_fix_page(checker, page_nbr, path):
+    """ Replaces all the must-replace characters in a page file."""
+    with codecs.open(path, mode='rb', encoding='utf-8') as f:
+        texts = [l.strip() for l in f]
+    texts = checker.quick_fix_lines(texts, [(str(page_nbr), idx + 1,) for idx in xrange(len(texts))])
+    with codecs.open(path, mode='wb', encoding='utf-8') as f:
+        for text in texts:
+            f.write(u'{}\n'.format(text))
+
+def extract_pdf(verbose, workers=None):
+    pdf_processor = process_pdf.PdfProcessor(verbose, workers)
     pdf_processor.expand_pdfs()
-    pdf_processor.extract_text_from_pdf()
-    pdf_processor.make_images_from_pdf()
+    pdf_processor.extract_pdf_pages()
 
 def symlink_images(verbose):
     pdf_processor = process_pdf.PdfProcessor(verbose)
@@ -529,6 +579,11 @@ def get_lang():
     config.read('book.cnf')
     return config.get('extract_text', 'lang')
 
+def word_list_path(lang):
+    """ Where the words of aspell's main dictionary are kept
+    for pruning fixes (made by the spell checker as needed)."""
+    return 'working/words.{}.txt'.format(lang)
+
 def interactive_fix(start_page, end_page):
     lang = get_lang()
     lm = line_manager.LineManager(
@@ -556,6 +611,7 @@ def run():
         ('extract_images', 'Extract page images from pdfs/tiffs'),
         ('extract_text', 'Extracts text from images'),
         ('extract_pdf', 'Extracts text from pdf, makes images of pages'),
+        ('pipeline', 'Crops, reads and cleans each page of pdfs/tiffs as soon as it is ready'),
         ('page_info', 'Writes out page info for mapping lines to image location'),
         ('spell_check', 'Writes maybe_ok file'),
         ('gui2', 'Looks for words in maybe_ok to see if should add to dict'),
@@ -616,7 +672,18 @@ def run():
         default=False,
         dest='tiffs',
         help='when processing, if the image files are tiff format')
+    parser.add_argument('-workers', type=int,
+        default=0,
+        dest='workers',
+        help='How many processes to use (defaults to one per core but one)')
+    parser.add_argument('-json-log', type=bool,
+        default=False,
+        dest='json_log',
+        help='Log automatic fixes as JSON lines to automatic_fixes.jsonl')
     args = parser.parse_args()
+    # leave a core for aspell and everything else
+    workers = args.workers or max(1, cpu_count() - 1)
+    spell_checker.JSON_FIX_LOG = args.json_log
     acceptable_actions = [action[0] for action in actions]
     if args.action not in acceptable_actions:
         print 'Please provide one of the following actions:'
@@ -630,16 +697,18 @@ def run():
         else:
             examine_page(args.page_nbr)
     elif args.action in ('extract_all', 'e',):
-        extract_images(args.tiffs, args.verbose)
-        extract_text(args.verbose)
+        extract_images(args.tiffs, args.verbose, workers)
+        extract_text(args.verbose, workers)
     elif args.action in ('extract_images', 'i',):
-        extract_images(args.tiffs, args.verbose)
+        extract_images(args.tiffs, args.verbose, workers)
     elif args.action in ('symlink_images', 'si',):
         symlink_images(args.verbose)
     elif args.action in ('extract_text', 't',):
-        extract_text(args.verbose)
+        extract_text(args.verbose, workers)
+    elif args.action in ('pipeline', 'pl',):
+        pipeline(args.tiffs, args.verbose, workers)
     elif args.action in ('extract_pdf', 'asfdasft',):
-        extract_pdf(args.verbose)
+        extract_pdf(args.verbose, workers)
     elif args.action in ('spell_check', 'a',):
         aspell_clean()
     elif args.action in ('page_info', 'pi',):
@@ -659,14 +728,14 @@ def run():
             end_page = args.end
         aspell_run(args.start, end_page)
     elif args.action in ('fix_all', 'ft',):
-        fix_spells()
-        cross_line_fixes()
+        fix_spells(workers)
+        cross_line_fixes(workers)
     elif args.action in ('fix_spells', 'ft',):
-        fix_spells()
+        fix_spells(workers)
     elif args.action in ('headers', 'hf',):
         possible_headers()
     elif args.action in ('fix_lines', 'ft',):
-        cross_line_fixes()
+        cross_line_fixes(workers)
     elif args.action in ('dpgui', 'dp',):
         run_dpgui()
     elif args.action in ('html', 'h',):
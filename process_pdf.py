@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 
 from argparse import ArgumentParser
+from collections import OrderedDict
 from ConfigParser import ConfigParser
+import hashlib
+from itertools import izip
+import json
+from multiprocessing import cpu_count, Pool
+from multiprocessing.pool import ThreadPool
 import os
 import shutil
 import subprocess
@@ -9,23 +15,39 @@ import sys
 import Image
 
 import matplotlib.pyplot as plt
+import numpy
+
+# what tesseract puts at the end of each page of text
+PAGE_SEPARATOR = '\f'
 
 class ImageHeuristic(object):
     """ Analyzes images
     and provides best-guess/fallback
     for where to crop.
+
+    workers: with more than one, images are analyzed and cropped
+    by a pool of processes when crop_all is called
     """
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, workers=1):
         self.verbose=verbose
+        self.workers = workers
         self.image_analyzers = []
+        self.image_paths = []
         self.analyzed = False
                 
-    def add_image(self, image_path):
-        try:
-            if self.verbose:
-                print 'Adding:', image_path
-            self.image_analyzers.append(ImageAnalyzer(image_path))
-        except PageCropException:
+    def add_image(self, image_path, destination_dir=None):
+        """ destination_dir: where to crop the image as soon as it is
+        analyzed, while it is still decoded, so crop_all only has
+        to open the images whose pages the fallback moves"""
+        if self.workers > 1:
+            self.image_paths.append(image_path)
+            return
+        if self.verbose:
+            print 'Adding:', image_path
+        image_path, ia = _analyze_and_crop((image_path, destination_dir, self.verbose,))
+        if ia:
+            self.image_analyzers.append(ia)
+        else:
             print 'IGNORING BAD PAGE:', image_path
         
     def analyze(self):
@@ -62,12 +84,66 @@ class ImageHeuristic(object):
         self.analyzed = True
 
     def crop_all(self, destination_dir, check_for_analysis=True):
+        if self.image_paths:
+            return self.crop_all_in_pool(destination_dir, check_for_analysis)
         if not self.image_analyzers:
             return
         if check_for_analysis and not self.analyzed:
             self.analyze()
         for ia in self.image_analyzers:
-            ia.crop(destination_dir, self.verbose)
+            if ia.cropped_bounds != ia.bounds():
+                ia.crop(destination_dir, self.verbose)
+
+    def crop_all_in_pool(self, destination_dir, check_for_analysis=True):
+        """ Analyzes and crops the added images with a pool of processes.
+
+        Each image is cropped as soon as it is analyzed, while it is
+        still decoded. The fallback for pages that are out of bounds
+        needs every image, so once they are all in, only the images
+        whose pages it moved are cropped again."""
+        pool = Pool(self.workers)
+        try:
+            results = pool.map(_analyze_and_crop,
+                [(image_path, destination_dir, self.verbose,) for image_path in self.image_paths])
+            for image_path, ia in results:
+                if ia:
+                    self.image_analyzers.append(ia)
+                else:
+                    print 'IGNORING BAD PAGE:', image_path
+            self.image_paths = []
+            if not self.image_analyzers:
+                return
+            if check_for_analysis and not self.analyzed:
+                self.analyze()
+            moved = [ia for ia in self.image_analyzers if ia.cropped_bounds != ia.bounds()]
+            pool.map(_crop, [(ia, destination_dir, self.verbose,) for ia in moved])
+            for ia in moved:
+                ia.cropped_bounds = ia.bounds()
+        finally:
+            pool.close()
+            pool.join()
+
+def _analyze_and_crop(args):
+    image_path, destination_dir, verbose = args
+    try:
+        im = Image.open(image_path)
+        ia = ImageAnalyzer(image_path, im)
+    except PageCropException:
+        return image_path, None
+    if destination_dir:
+        ia.crop(destination_dir, verbose, im)
+    return image_path, ia
+
+def _analyze(image_path):
+    try:
+        return image_path, ImageAnalyzer(image_path)
+    except PageCropException:
+        return image_path, None
+
+def _crop(args):
+    ia, destination_dir, verbose = args
+    ia.crop(destination_dir, verbose)
+    return ia
         
 class Page(object):
     def __init__(self, position_tuple, double_width):
@@ -83,15 +159,24 @@ class Page(object):
 
 class ImageAnalyzer(object):
 
-    def __init__(self, path_to_image):
+    def __init__(self, path_to_image, im=None):
         self.path_to_image = path_to_image
-        im = Image.open(self.path_to_image)
+        if im is None:
+            im = Image.open(self.path_to_image)
         image_file_name = os.path.basename(path_to_image)
         self.image_file_base, self.image_ext = os.path.splitext(image_file_name)
+        self.cropped_bounds = None
         self.load_pages(im)
 
-    def crop(self, destination_dir, verbose):
-        im = Image.open(self.path_to_image)
+    def bounds(self):
+        """ Returns where the pages will be cropped."""
+        return ((self.page_a.start, self.page_a.end,), (self.page_b.start, self.page_b.end,),)
+
+    def crop(self, destination_dir, verbose, im=None):
+        """ Saves the two pages, from im if the image is already open."""
+        if im is None:
+            im = Image.open(self.path_to_image)
+        self.cropped_bounds = self.bounds()
         image_page_a = im.crop((self.page_a.start -5, 0, self.page_a.end + 5, self.im_height,))
         image_page_a.save('{}/{}-a{}'.format(destination_dir, self.image_file_base, self.image_ext))
 	if verbose:
@@ -108,52 +193,28 @@ class ImageAnalyzer(object):
         self.page_a = Page(page_data_a, self.im_width)
         self.page_b = Page(page_data_b, self.im_width)
 
-    def columns(self, im):
+    def pixels(self, im):
+        """ Returns the image as an array."""
         self.im_width, self.im_height = im.size
-        
-        columns = [[] for i in xrange(self.im_width)]
-        for index, pixel, in enumerate(im.getdata()):
-            columns[index % self.im_width].append(pixel)
-        return columns
+        return numpy.asarray(im)
 
-    def text_rows(self):
+    def text_rows(self, im):
         """ Returns an array of tuples that define individual rows of text.
 
-        tuple: (x-start, y-start, x-end, y-end)
+        tuple: (y-start, x-start, y-end, x-end)
         """
-        rows = []
-        first_black_row = -1
-        last_black_row = -1
-        current_row = []
-        for idx, row in enumerate(self.rows):
-            avg = sum(row)/len(row)
-            if avg < 251:
-                if first_black_row == -1:
-                    first_black_row = idx
-                last_black_row = idx
-                current_row.append(row)
-            else:
-                if last_black_row - first_black_row > 10:
-                    rows.append((first_black_row, last_black_row, current_row,))
-                current_row = []
-                first_black_row = -1
-                last_black_row = -1
+        pixels = self.pixels(im)
+        # a row is inked if its average (rounded down) is below 251
+        inked_rows = pixel_sums(pixels, 1) < 251 * self.im_width
         full_tuples = []
-        for fbr, lbr, row_data in rows:
-            columns = [[] for i in xrange(len(row_data[0]))]
-
-            for row in row_data:
-                for index, pixel in enumerate(row):
-                    columns[index].append(pixel)
-            first_black_column = -1
-            last_black_column = -1
-            for idx, column in enumerate(columns):
-                avg = sum(column)/len(column)
-                if avg < 254:
-                    if first_black_column == -1:
-                        first_black_column = idx
-                    last_black_column = idx
-            full_tuples.append((fbr, first_black_column, lbr, last_black_column,))
+        for fbr, lbr in inked_runs(inked_rows):
+            if lbr - fbr > 10:
+                inked_columns = numpy.flatnonzero(
+                    pixel_sums(pixels[fbr:lbr + 1], 0) < 254 * (lbr + 1 - fbr))
+                if len(inked_columns):
+                    full_tuples.append((fbr, int(inked_columns[0]), lbr, int(inked_columns[-1]),))
+                else:
+                    full_tuples.append((fbr, -1, lbr, -1,))
         return full_tuples
         
     def text_columns(self, im):
@@ -161,23 +222,10 @@ class ImageAnalyzer(object):
         (within sensitivity pixels of being a pure white column).
         returns the x boundaries of the columns in descending order
         of width."""
-        inked_blocks = []
-
-        columns = self.columns(im)
-        first_black_column = -1
-        last_black_column = -1
-
-        for index, column in enumerate(columns):
-            avg = sum(column)/len(column)
-            if avg < 254:
-                if first_black_column == -1:
-                    first_black_column = index
-                last_black_column = index
-            else:
-                if last_black_column > first_black_column > -1:
-                    inked_blocks.append((first_black_column, last_black_column,))
-                first_black_column = -1
-                last_black_column = -1
+        self.column_sums = pixel_sums(self.pixels(im), 0)
+        # a column is inked if its average (rounded down) is below 254
+        inked_columns = self.column_sums < 254 * self.im_height
+        inked_blocks = [(first, last,) for first, last in inked_runs(inked_columns) if last > first]
         if len(inked_blocks) >= 2:
             return sorted(sorted(inked_blocks, reverse=True, key=lambda x: x[1] - x[0])[:2], key=lambda x: x[0])
         else:
@@ -186,19 +234,41 @@ class ImageAnalyzer(object):
         
     def graph(self):
         plt.close('all')
-        column_avgs = [255 - (sum(column)/len(column)) for column in self.columns]
-        plt.plot(xrange(len(self.columns)), column_avgs, 'b-')
+        column_avgs = 255 - self.column_sums/self.im_height
+        plt.plot(xrange(len(column_avgs)), column_avgs, 'b-')
         plt.savefig('{}.png'.format(self.image_file_base))
 
 class PageCropException(Exception):
     pass
 
+def pixel_sums(pixels, axis):
+    """ Returns the sums of the pixel values of an image array
+    along an axis (0 for columns, 1 for rows)."""
+    sums = pixels.sum(axis=axis, dtype=numpy.int64)
+    if pixels.dtype == bool:
+        # black and white images come back as True for white
+        sums *= 255
+    return sums
+
+def inked_runs(inked):
+    """ Takes an array of flags and returns (first, last) for each
+    run of set flags that is followed by an unset one."""
+    edges = numpy.diff(numpy.concatenate(([0], inked.astype(numpy.int8), [0])))
+    firsts = numpy.flatnonzero(edges == 1)
+    lasts = numpy.flatnonzero(edges == -1) - 1
+    return [(int(first), int(last),) for first, last in zip(firsts, lasts) if last < len(inked) - 1]
+
 class PdfProcessor(object):
-    def __init__(self, verbose=False):
+    # which files in pdfs to extract images from
+    source_extensions = ('pdf',)
+
+    def __init__(self, verbose=False, workers=None):
         self.project_path = os.path.abspath('.')
         self.config = ConfigParser()
         self.config.read('book.cnf')
         self.verbose = verbose
+        # default to one per core
+        self.workers = workers or cpu_count()
 
     def fix(self):
         os.chdir('{}/fail_crop'.format(self.destination_dir))
@@ -227,14 +297,14 @@ class PdfProcessor(object):
         for root, dirs, files in os.walk(source_dir):
             if not files:
                 continue
-            image_heuristic = ImageHeuristic(verbose=self.verbose)
+            image_heuristic = ImageHeuristic(verbose=self.verbose, workers=self.workers)
             destination_dir = root.replace('/raw/', '/cropped/')
             maybe_make_dir(destination_dir)
             if self.verbose:
                 print 'Adding files from', root
             for f in files:
                 source_file = '{}/{}'.format(root, f)
-                image_heuristic.add_image(source_file)
+                image_heuristic.add_image(source_file, destination_dir)
             image_heuristic.crop_all(destination_dir)
 
     def setup(self):
@@ -242,20 +312,38 @@ class PdfProcessor(object):
             maybe_make_dir('{}/images'.format(self.destination_dir))
     
     def extract_images_from_pdfs(self):
-        os.chdir(self.project_path)
-        for full_filename in os.listdir('pdfs'):
-            os.chdir(self.project_path)
-            if full_filename.endswith('pdf'):
-                filename, ext = os.path.splitext(full_filename)
-                working_dir = 'images/raw/{}'.format(filename)
-                maybe_make_dir(working_dir)
-                shutil.copy('pdfs/{}'.format(full_filename), working_dir)
-                os.chdir(working_dir)
-                os.system('pdfimages {} {}'.format(full_filename, filename))
-                os.remove(full_filename)
-        os.chdir(self.project_path)
+        """ Extracts the images of all the pdfs in pdfs at once."""
+        pool = ThreadPool(self.workers)
+        try:
+            pool.map(self.extract_images_from_file, self.source_files(self.source_extensions))
+        finally:
+            pool.close()
+            pool.join()
+
+    def extract_images_from_file(self, source):
+        """ Extracts the images of one file in pdfs into images/raw/<name>."""
+        path_to_pdf, filename = source
+        working_dir = '{}/images/raw/{}'.format(self.project_path, filename)
+        maybe_make_dir(working_dir)
+        self.run(['pdfimages', path_to_pdf, '{}/{}'.format(working_dir, filename),])
+
+    def source_files(self, extensions):
+        """ Returns (path, name without extension) for each file
+        in pdfs that ends with one of extensions."""
+        pdfs_dir = '{}/pdfs'.format(self.project_path)
+        return [('{}/{}'.format(pdfs_dir, full_filename), os.path.splitext(full_filename)[0],)
+            for full_filename in sorted(os.listdir(pdfs_dir)) if full_filename.endswith(extensions)]
+
+    def run(self, command, stdout=None):
+        """ Runs a command (a list of arguments) and returns its exit code."""
+        if self.verbose:
+            print ' '.join(command)
+        return subprocess.call(command, stdout=stdout)
 
     def extract_text_from_pages(self, lang='eng'):
+        """ Reads the text of the cropped pages whose images have not
+        been read yet. Text already read from an image is used again,
+        wherever the image now falls in the book."""
         os.chdir('{}/images/cropped'.format(self.project_path))
         linked_images_dir = os.path.abspath('{}/images/pages/'.format(self.project_path))
         maybe_make_dir(linked_images_dir)
@@ -263,38 +351,257 @@ class PdfProcessor(object):
         maybe_make_dir(raw_destination_dir)
         clean_destination_dir = '{}/text/clean/'.format(self.project_path)
         maybe_make_dir(clean_destination_dir)
-        current_page = self.config.getint('extract_text', 'start_page_number')
-        ignores = self.config.get('extract_text', 'ignore_pages').split()
-        for root in self.config.get('extract_text', 'ordered_dirnames').split():
-            for f in sorted(os.listdir(root)):
-                source_file = '{}/{}'.format(root, f)
-                if f in ignores or source_file in ignores:
-                    continue
-                basename, ext = os.path.splitext(f)
-                command = 'tesseract {} {} -l {}'.format(source_file, current_page, lang)
-                if self.verbose:
-                    print command
-                os.system(command)
-                os.symlink(os.path.abspath(source_file), '{}/{}.pbm'.format(linked_images_dir, current_page))
-                shutil.copy('{}.txt'.format(current_page), clean_destination_dir)
-                shutil.move('{}.txt'.format(current_page), raw_destination_dir)
-                current_page += 1
+        manifest = OcrManifest('{}/text/ocr_manifest.json'.format(self.project_path))
+        texts = manifest.read_texts(raw_destination_dir, clean_destination_dir)
+        pool = ThreadPool(self.workers)
+        try:
+            pages = self.page_numbers()
+            image_hashes = dict(zip(pages, pool.map(lambda page: file_hash(page[0]), pages)))
+            manifest.keep(image_hashes.values())
+            pages_to_read = []
+            for page in pages:
+                source_file, page_nbr = page
+                text = texts.get(image_hashes[page])
+                if self.reuse_text(page, text, linked_images_dir, raw_destination_dir, clean_destination_dir):
+                    manifest.record(source_file, page_nbr, image_hashes[page],
+                        '{}{}.txt'.format(raw_destination_dir, page_nbr), text[3])
+                else:
+                    pages_to_read.append(page)
+            manifest.save()
+            if self.verbose:
+                print 'Reading {} of {} pages'.format(len(pages_to_read), len(pages))
+            for batch in pool.imap_unordered(
+                    lambda batch: self.run_tesseract_batch(batch, lang), self.batches(pages_to_read)):
+                for page in batch:
+                    source_file, page_nbr = page
+                    replace_symlink(os.path.abspath(source_file), '{}/{}.pbm'.format(linked_images_dir, page_nbr))
+                    text_file = '{}.txt'.format(page_nbr)
+                    shutil.copy(text_file, clean_destination_dir)
+                    # to the full path, which may already be there
+                    shutil.move(text_file, '{}{}'.format(raw_destination_dir, text_file))
+                    manifest.record(source_file, page_nbr, image_hashes[page], '{}{}'.format(raw_destination_dir, text_file))
+                # so a run that dies only has to redo the batches in progress
+                manifest.save()
+        finally:
+            pool.close()
+            pool.join()
         os.chdir(self.project_path)
 
-    def symlink_images(self):
-        linked_images_dir = os.path.abspath('{}/images/pages/'.format(self.project_path))
+    def reuse_text(self, page, text, linked_images_dir, raw_destination_dir, clean_destination_dir):
+        """ Puts the text already read from a page's image (as returned
+        by OcrManifest.read_texts) in place for the page, returning
+        whether there was any. The clean text goes with it if the
+        page has a new number."""
+        if text is None:
+            return False
+        source_file, page_nbr = page
+        old_page_nbr, raw_text, clean_text, cleaned = text
+        if old_page_nbr != page_nbr:
+            with open(os.path.join(raw_destination_dir, '{}.txt'.format(page_nbr)), 'wb') as f:
+                f.write(raw_text)
+            with open(os.path.join(clean_destination_dir, '{}.txt'.format(page_nbr)), 'wb') as f:
+                f.write(raw_text if clean_text is None else clean_text)
+        replace_symlink(os.path.abspath(source_file), '{}/{}.pbm'.format(linked_images_dir, page_nbr))
+        return True
+
+    def run_tesseract(self, page, lang, output_dir=''):
+        """ Reads the text of a page image into <page number>.txt in output_dir."""
+        source_file, page_nbr = page
+        self.run(['tesseract', source_file, os.path.join(output_dir, str(page_nbr)), '-l', lang,])
+        return page
+
+    def run_tesseract_batch(self, pages, lang, output_dir=''):
+        """ Reads the text of several page images with one tesseract run,
+        so the language data is only loaded once, then splits it
+        into <page number>.txt in output_dir for each page."""
+        if len(pages) == 1:
+            return [self.run_tesseract(pages[0], lang, output_dir)]
+        batch_name = os.path.join(output_dir, 'batch-{}'.format(pages[0][1]))
+        with open('{}.list'.format(batch_name), 'w') as f:
+            for source_file, page_nbr in pages:
+                f.write('{}\n'.format(source_file))
+        self.run(['tesseract', '{}.list'.format(batch_name), batch_name, '-l', lang,])
+        os.remove('{}.list'.format(batch_name))
+        texts = []
+        if os.path.exists('{}.txt'.format(batch_name)):
+            with open('{}.txt'.format(batch_name), 'r') as f:
+                # every page ends with a form feed
+                texts = f.read().split(PAGE_SEPARATOR)[:-1]
+            os.remove('{}.txt'.format(batch_name))
+        if len(texts) != len(pages):
+            # a page was skipped, so there is no telling which text is whose
+            return [self.run_tesseract(page, lang, output_dir) for page in pages]
+        for (source_file, page_nbr), text in zip(pages, texts):
+            with open(os.path.join(output_dir, '{}.txt'.format(page_nbr)), 'w') as f:
+                f.write(text + PAGE_SEPARATOR)
+        return pages
+
+    def batches(self, pages, per_worker=2):
+        """ Splits pages into a few runs of consecutive pages for each worker."""
+        count = min(len(pages), self.workers * per_worker)
+        return [pages[idx * len(pages) / count:(idx + 1) * len(pages) / count] for idx in xrange(count)]
+
+    def stream_text_from_pdfs(self, lang='eng', batch_size=4):
+        """ Extracts the images of the files in pdfs, crops them and
+        reads the text of their pages, yielding a StreamedPage for
+        each page as soon as its text is in text/raw and text/clean.
+        Like extract_text_from_pages, it also links the page images
+        and records them in the manifest.
+
+        Each file's images are cropped as soon as they are extracted,
+        and its pages are read batch_size at a time as soon as they
+        are cropped. Text already read from a page image is used
+        again instead. The fallback for pages that are out of bounds
+        needs all of a file's images, so they are all analyzed before
+        any is cropped, and each page comes up once."""
+        cropped_dir = '{}/images/cropped'.format(self.project_path)
+        linked_images_dir = '{}/images/pages'.format(self.project_path)
         maybe_make_dir(linked_images_dir)
+        raw_destination_dir = '{}/text/raw'.format(self.project_path)
+        maybe_make_dir(raw_destination_dir)
+        clean_destination_dir = '{}/text/clean'.format(self.project_path)
+        maybe_make_dir(clean_destination_dir)
+        # tesseract writes here, so a half-written file never lands in text/raw
+        scratch_dir = '{}/working/ocr'.format(self.project_path)
+        maybe_make_dir(scratch_dir)
+        manifest = OcrManifest('{}/text/ocr_manifest.json'.format(self.project_path))
+        texts = manifest.read_texts(raw_destination_dir, clean_destination_dir)
+
+        extract_pool = ThreadPool(self.workers)
+        crop_pool = Pool(self.workers)
+        ocr_pool = ThreadPool(self.workers)
+        try:
+            extractions = {}
+            for source in self.source_files(self.source_extensions):
+                extractions[source[1]] = extract_pool.apply_async(self.extract_images_from_file, (source,))
+            current_page = self.config.getint('extract_text', 'start_page_number')
+            ignores = self.config.get('extract_text', 'ignore_pages').split()
+            image_hashes = []
+            pending = []
+            for root_name in self.config.get('extract_text', 'ordered_dirnames').split():
+                if root_name in extractions:
+                    extractions.pop(root_name).get()
+                root = '{}/images/raw/{}'.format(self.project_path, root_name)
+                destination_dir = '{}/{}'.format(cropped_dir, root_name)
+                maybe_make_dir(destination_dir)
+                image_heuristic = ImageHeuristic(self.verbose)
+                for image_path, ia in crop_pool.map(_analyze,
+                        ['{}/{}'.format(root, f) for f in sorted(os.listdir(root))]):
+                    if ia:
+                        image_heuristic.image_analyzers.append(ia)
+                    else:
+                        print 'IGNORING BAD PAGE:', image_path
+                if not image_heuristic.image_analyzers:
+                    continue
+                image_heuristic.analyze()
+                to_read = []
+                for ia in crop_pool.imap(_crop,
+                        [(ia, destination_dir, self.verbose,) for ia in image_heuristic.image_analyzers]):
+                    for side in ('a', 'b',):
+                        f = '{}-{}{}'.format(ia.image_file_base, side, ia.image_ext)
+                        if self.ignored(root_name, destination_dir, f, ignores):
+                            continue
+                        page = StreamedPage('{}/{}'.format(destination_dir, f), current_page,
+                            file_hash('{}/{}'.format(destination_dir, f)),
+                            '{}/{}.txt'.format(raw_destination_dir, current_page))
+                        current_page += 1
+                        image_hashes.append(page.image_hash)
+                        text = texts.get(page.image_hash)
+                        if self.reuse_text((page.source_file, page.page_nbr,), text, linked_images_dir,
+                                raw_destination_dir, clean_destination_dir):
+                            page.new = text[0] != page.page_nbr
+                            page.cleaned = text[3]
+                            self.finish_page(page, manifest)
+                            for page in self.hand_out([page], manifest):
+                                yield page
+                            continue
+                        to_read.append(page)
+                        if len(to_read) == batch_size:
+                            pending.append(ocr_pool.apply_async(self.read_pages, (to_read, lang, scratch_dir,)))
+                            to_read = []
+                    while pending and pending[0].ready():
+                        for page in self.hand_out(self.finish_read_pages(
+                                pending.pop(0).get(), linked_images_dir, clean_destination_dir, manifest), manifest):
+                            yield page
+                if to_read:
+                    pending.append(ocr_pool.apply_async(self.read_pages, (to_read, lang, scratch_dir,)))
+            while pending:
+                for page in self.hand_out(self.finish_read_pages(
+                        pending.pop(0).get(), linked_images_dir, clean_destination_dir, manifest), manifest):
+                    yield page
+            manifest.keep(image_hashes)
+        except BaseException:
+            # including the consumer stopping early
+            extract_pool.terminate()
+            crop_pool.terminate()
+            ocr_pool.terminate()
+            raise
+        else:
+            extract_pool.close()
+            crop_pool.close()
+            ocr_pool.close()
+        finally:
+            extract_pool.join()
+            crop_pool.join()
+            ocr_pool.join()
+            manifest.save()
+
+    def read_pages(self, pages, lang, scratch_dir):
+        """ Reads the text of a batch of StreamedPages into text/raw."""
+        self.run_tesseract_batch([(page.source_file, page.page_nbr,) for page in pages], lang, scratch_dir)
+        for page in pages:
+            shutil.move(os.path.join(scratch_dir, '{}.txt'.format(page.page_nbr)), page.raw_text_file)
+        return pages
+
+    def finish_read_pages(self, pages, linked_images_dir, clean_destination_dir, manifest):
+        for page in pages:
+            replace_symlink(page.source_file, '{}/{}.pbm'.format(linked_images_dir, page.page_nbr))
+            shutil.copy(page.raw_text_file, clean_destination_dir)
+            self.finish_page(page, manifest)
+        return pages
+
+    def finish_page(self, page, manifest):
+        manifest.record(os.path.relpath(page.source_file, '{}/images/cropped'.format(self.project_path)),
+            page.page_nbr, page.image_hash, page.raw_text_file, page.cleaned)
+        # so a run that dies only has to read the pages in progress again
+        manifest.save()
+
+    def hand_out(self, pages, manifest):
+        """ Yields each page, then notes in the manifest
+        whether whoever took it cleaned it."""
+        for page in pages:
+            yield page
+            manifest.set_cleaned(page.image_hash, page.cleaned)
+
+    def page_numbers(self, root_format='{}'):
+        """ Returns (source_file, page number) for each page image,
+        numbered in the configured order, skipping ignored pages.
+
+        root_format turns a configured dirname into its directory."""
+        pages = []
         current_page = self.config.getint('extract_text', 'start_page_number')
         ignores = self.config.get('extract_text', 'ignore_pages').split()
         for root_name in self.config.get('extract_text', 'ordered_dirnames').split():
-            root = '{}/images/cropped/{}'.format(self.project_path, root_name)
+            root = root_format.format(root_name)
             for f in sorted(os.listdir(root)):
-                source_file = '{}/{}'.format(root, f)
-                if f in ignores or source_file in ignores:
+                if self.ignored(root_name, root, f, ignores):
                     continue
-                basename, ext = os.path.splitext(f)
-                os.symlink(os.path.abspath(source_file), '{}/{}.pbm'.format(linked_images_dir, current_page))
+                source_file = '{}/{}'.format(root, f)
+                pages.append((source_file, current_page,))
                 current_page += 1
+        return pages
+
+    def ignored(self, root_name, root, f, ignores):
+        """ Whether the page image f in the root directory
+        for root_name is one of the ignored pages."""
+        return f in ignores or '{}/{}'.format(root, f) in ignores or \
+            '{}/{}'.format(root_name, f) in ignores
+
+    def symlink_images(self):
+        linked_images_dir = os.path.abspath('{}/images/pages/'.format(self.project_path))
+        maybe_make_dir(linked_images_dir)
+        for source_file, page_nbr in self.page_numbers('{}/images/cropped/{{}}'.format(self.project_path)):
+            replace_symlink(os.path.abspath(source_file), '{}/{}.pbm'.format(linked_images_dir, page_nbr))
         os.chdir(self.project_path)
 
     def expand_pdfs(self):
@@ -306,9 +613,7 @@ class PdfProcessor(object):
         pdf_name = [pdf for pdf in os.listdir(pdfs_dir) if pdf.endswith('pdf')][0]
 
         # make sure pdftk available
-        with open('/dev/null', 'wb') as f:
-            if subprocess.call(['which', 'pdftk',], stdout=f, stderr=f):
-                raise Exception('pdftk must be available to expand pdfs')
+        check_available('pdftk', 'expand pdfs')
 
         maybe_make_dir('{}/working'.format(pdfs_dir))
         cmd = 'pdftk {}/{} burst output {}/working/%d.pdf'.format(pdfs_dir, pdf_name, pdfs_dir)
@@ -317,71 +622,195 @@ class PdfProcessor(object):
         os.system(cmd)
 
     def extract_text_from_pdf(self):
-        # make sure pdftotext available
-        with open('/dev/null', 'wb') as f:
-            if subprocess.call(['which', 'pdftotext',], stdout=f, stderr=f):
-                raise Exception('pdftotext must be available to extract text from pdfs')
+        self.extract_pdf_pages(images=False)
 
-        raw_text_dir = '{}/text/raw'.format(self.project_path)
-        maybe_make_dir(raw_text_dir)
-        clean_text_dir = '{}/text/clean'.format(self.project_path)
-        maybe_make_dir(clean_text_dir)
-
-
-        for filename in os.listdir('{}/pdfs/working'.format(self.project_path)):
-            page_nbr, extension = os.path.splitext(filename)
-            if extension == '.pdf':
-                raw_text_file = '{}/{}.txt'.format(raw_text_dir, page_nbr)
-                cmd = 'pdftotext {}/pdfs/working/{} {}'.format(self.project_path, filename, raw_text_file)
-                if self.verbose:
-                    print cmd
-                os.system(cmd)
-                os.system("sed -i '/^$/d' {}".format(raw_text_file))
-                shutil.copy(raw_text_file, clean_text_dir)
-        
     def make_images_from_pdf(self):
-        # make sure convert available
-        with open('/dev/null', 'wb') as f:
-            if subprocess.call(['which', 'convert',], stdout=f, stderr=f):
-                raise Exception('convert must be available to make images from pdfs')
-
-        page_image_dir = '{}/images/pages'.format(self.project_path)
-        maybe_make_dir(page_image_dir)
+        self.extract_pdf_pages(text=False)
 
-        for filename in os.listdir('{}/pdfs/working'.format(self.project_path)):
+    def extract_pdf_pages(self, text=True, images=True):
+        """ Extracts the text and/or makes the image of each page
+        burst from the pdf, running the pages' commands side by side."""
+        working_dir = '{}/pdfs/working'.format(self.project_path)
+        pages = []
+        for filename in sorted(os.listdir(working_dir)):
             page_nbr, extension = os.path.splitext(filename)
             if extension == '.pdf':
-                page_image_file = '{}/{}.pbm'.format(page_image_dir, page_nbr)
-                cmd = 'convert -density 200 -trim -bordercolor White -border 2x2 +repage {}/pdfs/working/{} {}'.format(self.project_path, filename, page_image_file)
-                if self.verbose:
-                    print cmd
-                os.system(cmd)
+                pages.append(('{}/{}'.format(working_dir, filename), page_nbr,))
+        tasks = []
+        if text:
+            # make sure pdftotext available
+            check_available('pdftotext', 'extract text from pdfs')
+            maybe_make_dir('{}/text/raw'.format(self.project_path))
+            maybe_make_dir('{}/text/clean'.format(self.project_path))
+            tasks.extend([(self.extract_text_from_pdf_page, page,) for page in pages])
+        if images:
+            # make sure convert available
+            check_available('convert', 'make images from pdfs')
+            maybe_make_dir('{}/images/pages'.format(self.project_path))
+            tasks.extend([(self.make_image_from_pdf_page, page,) for page in pages])
+        pool = ThreadPool(self.workers)
+        try:
+            # a page's text and image side by side
+            pool.map(lambda task: task[0](task[1]), sorted(tasks, key=lambda task: task[1]))
+        finally:
+            pool.close()
+            pool.join()
+
+    def extract_text_from_pdf_page(self, page):
+        path_to_pdf, page_nbr = page
+        raw_text_file = '{}/text/raw/{}.txt'.format(self.project_path, page_nbr)
+        self.run(['pdftotext', path_to_pdf, raw_text_file,])
+        remove_blank_lines(raw_text_file)
+        shutil.copy(raw_text_file, '{}/text/clean'.format(self.project_path))
+
+    def make_image_from_pdf_page(self, page):
+        path_to_pdf, page_nbr = page
+        page_image_file = '{}/images/pages/{}.pbm'.format(self.project_path, page_nbr)
+        self.run(['convert', '-density', '200', '-trim', '-bordercolor', 'White', '-border', '2x2', '+repage',
+            path_to_pdf, page_image_file,])
 
 class TiffProcessor(PdfProcessor):
     """ Same thing, but for multipage tiff files."""
-    def __init__(self, verbose=False):
-        PdfProcessor.__init__(self, verbose)
+    source_extensions = ('tiff', 'tif',)
+
+    def __init__(self, verbose=False, workers=None):
+        PdfProcessor.__init__(self, verbose, workers)
 
     def extract_images_from_pdfs(self):
-        os.chdir(self.project_path)
-        for full_filename in os.listdir('pdfs'):
-            os.chdir(self.project_path)
-            if full_filename.endswith('tiff') or full_filename.endswith('tif'):
-                filename, ext = os.path.splitext(full_filename)
-                working_dir = 'images/raw/{}'.format(filename)
-                maybe_make_dir(working_dir)
-                shutil.copy('pdfs/{}'.format(full_filename), working_dir)
-                os.chdir(working_dir)
-                os.system('tiffsplit {}'.format(full_filename))
-                os.remove(full_filename)
-                for idx, tiffname in enumerate(sorted(os.listdir('.'))):
-                    if tiffname.endswith('tif'):
-                        cmd = 'tifftopnm -respectfillorder {} > {}-{:03d}.pbm'.format(tiffname, filename, idx)
-                        if self.verbose:
-                            print cmd
-                        os.system(cmd)
-                        os.remove(tiffname)
-        os.chdir(self.project_path)
+        """ Splits all the tiffs in pdfs at once, converting
+        their pages as soon as each one is split."""
+        pool = ThreadPool(self.workers)
+        try:
+            conversions = []
+            for pages in pool.imap_unordered(self.split_tiff, self.source_files(self.source_extensions)):
+                conversions.extend([pool.apply_async(self.convert_tiff_page, (page,)) for page in pages])
+            for conversion in conversions:
+                conversion.get()
+        finally:
+            pool.close()
+            pool.join()
+
+    def extract_images_from_file(self, source):
+        for page in self.split_tiff(source):
+            self.convert_tiff_page(page)
+
+    def split_tiff(self, source):
+        """ Splits a tiff into one file per page and returns
+        (page tiff, pbm to convert it to) for each."""
+        path_to_tiff, filename = source
+        working_dir = '{}/images/raw/{}'.format(self.project_path, filename)
+        maybe_make_dir(working_dir)
+        self.run(['tiffsplit', path_to_tiff, '{}/x'.format(working_dir),])
+        tiffnames = sorted([tiffname for tiffname in os.listdir(working_dir) if tiffname.endswith('tif')])
+        return [('{}/{}'.format(working_dir, tiffname), '{}/{}-{:03d}.pbm'.format(working_dir, filename, idx),)
+            for idx, tiffname in enumerate(tiffnames)]
+
+    def convert_tiff_page(self, page):
+        tiff_page, pbm = page
+        with open(pbm, 'wb') as f:
+            self.run(['tifftopnm', '-respectfillorder', tiff_page,], f)
+        os.remove(tiff_page)
+
+class StreamedPage(object):
+    """ A page as PdfProcessor.stream_text_from_pdfs hands it out.
+
+    new: whether its text is new to its page number
+    cleaned: whether its clean text has been through header removal
+    and quick fixes; whoever takes the page sets it once it has
+    """
+    def __init__(self, source_file, page_nbr, image_hash, raw_text_file, new=True, cleaned=False):
+        self.source_file = source_file
+        self.page_nbr = page_nbr
+        self.image_hash = image_hash
+        self.raw_text_file = raw_text_file
+        self.new = new
+        self.cleaned = cleaned
+
+class OcrManifest(object):
+    """ Records, for each page image (by its md5), the page number
+    its text was read to, the image's path, the md5 of the text
+    tesseract made of it and whether its clean text has been through
+    header removal and quick fixes, so text already read can be used
+    again wherever the image falls in the book."""
+    def __init__(self, path):
+        self.path = path
+        self.images = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.images = json.load(f)
+
+    def read_texts(self, raw_dir, clean_dir):
+        """ Returns, by image md5, (page number, raw text, clean text,
+        whether the clean text is cleaned) for each image whose raw
+        text is still what was read from it.
+
+        Read up front, as renumbered pages may write over them."""
+        texts = {}
+        for image_hash, entry in self.images.items():
+            raw_text_file = os.path.join(raw_dir, '{}.txt'.format(entry['page']))
+            if not os.path.exists(raw_text_file) or file_hash(raw_text_file) != entry['text_hash']:
+                continue
+            with open(raw_text_file, 'rb') as f:
+                raw_text = f.read()
+            clean_text = None
+            clean_text_file = os.path.join(clean_dir, '{}.txt'.format(entry['page']))
+            if os.path.exists(clean_text_file):
+                with open(clean_text_file, 'rb') as f:
+                    clean_text = f.read()
+            cleaned = entry.get('cleaned', False) and clean_text is not None
+            texts[image_hash] = (entry['page'], raw_text, clean_text, cleaned,)
+        return texts
+
+    def record(self, source_file, page_nbr, image_hash, text_file, cleaned=False):
+        self.images[image_hash] = OrderedDict((
+            ('page', page_nbr),
+            ('source', source_file),
+            ('text_hash', file_hash(text_file)),
+            ('cleaned', cleaned),
+        ))
+
+    def set_cleaned(self, image_hash, cleaned):
+        if image_hash in self.images:
+            self.images[image_hash]['cleaned'] = cleaned
+
+    def keep(self, image_hashes):
+        """ Forgets images that are no longer in the book."""
+        image_hashes = set(image_hashes)
+        for image_hash in self.images.keys():
+            if image_hash not in image_hashes:
+                del self.images[image_hash]
+
+    def save(self):
+        # write then rename so a crash can't leave half a manifest
+        with open('{}.tmp'.format(self.path), 'w') as f:
+            json.dump(self.images, f, indent=1, sort_keys=True)
+        os.rename('{}.tmp'.format(self.path), self.path)
+
+def file_hash(path):
+    """ Returns md5 of the contents of a file."""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), ''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def replace_symlink(source, link_name):
+    """ Points link_name at source, whether or not it already exists."""
+    if os.path.lexists(link_name):
+        os.remove(link_name)
+    os.symlink(source, link_name)
+
+def remove_blank_lines(path):
+    """ Rewrites a text file without its empty lines."""
+    with open(path, 'r') as f:
+        lines = [line for line in f if line != '\n']
+    with open(path, 'w') as f:
+        f.writelines(lines)
+
+def check_available(program, action):
+    with open('/dev/null', 'wb') as f:
+        if subprocess.call(['which', program,], stdout=f, stderr=f):
+            raise Exception('{} must be available to {}'.format(program, action))
 
 def maybe_make_dir(dir_):
     try:
@@ -4,10 +4,20 @@
 * given a string, return whether it is 'garbage'
 """
 
+import atexit
+from bisect import bisect_left, insort
 import codecs
+from collections import OrderedDict
+import hashlib
+import json
 import os
 import re
+import sqlite3
+import sre_constants
+import sre_parse
 from subprocess import Popen, PIPE
+import time
+import weakref
 
 from regex_helper import REGEX_LETTER, REGEX_CAPITAL, REGEX_SMALL, FRENCH_BAD_SINGLES, ENGLISH_BAD_SINGLES
 
@@ -16,6 +26,12 @@ ends_with_lowercase = re.compile(u'.*{}$'.format(REGEX_SMALL), re.UNICODE).match
 ends_with_hyphen = re.compile(r'.*-$', re.UNICODE).match
 starts_with_capital = re.compile(u'["\']?{}'.format(REGEX_CAPITAL), re.UNICODE).match
 starts_with_lower_case = re.compile(u'["\']?{}'.format(REGEX_SMALL), re.UNICODE).match
+# log fixes to automatic_fixes.jsonl, as JSON lines, by default
+JSON_FIX_LOG = False
+
+dictionary_words = re.compile(u"{}+(?:['-]{}+)*".format(REGEX_LETTER, REGEX_LETTER), re.UNICODE).findall
+word_pieces = re.compile(u"[-']").split
+dictionary_word_matches = re.compile(u"{}+(?:['-]{}+)*".format(REGEX_LETTER, REGEX_LETTER), re.UNICODE).finditer
 
 class BaseSpellFixer(object):
     """
@@ -126,6 +142,233 @@ class BaseSpellFixer(object):
             (re.compile(r"'[ds]$", flags=re.UNICODE), ''), 
             (re.compile(r'(...)-.*', flags=re.UNICODE), r'\1'),
         ]   
+        self.engine = None
+        self.quick_engine = None
+        self.scanners = {}
+
+    def scanner(self, regexes):
+        """ Returns a PatternScanner for one of the lists of
+        regexes (strict_checks, odd_punctuation)."""
+        scanner = self.scanners.get(id(regexes))
+        if scanner is None or scanner.regexes is not regexes or len(scanner.rules) != len(regexes):
+            scanner = PatternScanner(regexes)
+            self.scanners[id(regexes)] = scanner
+        return scanner
+
+    def quick_fix_engine(self):
+        """ Returns a QuickFixEngine for the current quick fixes."""
+        if not self.quick_engine or self.quick_engine.quick_fixes is not self.quick_fixes \
+            or len(self.quick_engine.rules) != len(self.quick_fixes):
+            self.quick_engine = QuickFixEngine(self.quick_fixes)
+        return self.quick_engine
+
+    def letter_fix_engine(self):
+        """ Returns a LetterFixEngine for the current letter fixes."""
+        if not self.engine or self.engine.letter_fixes is not self.letter_fixes \
+            or len(self.engine.rules) != len(self.letter_fixes):
+            self.engine = LetterFixEngine(self.letter_fixes)
+        return self.engine
+
+class QuickFixEngine(object):
+    """ Applies quick fixes to text.
+
+    The fixes are applied one after another, as each may work on what
+    the one before it did, but a single pass with all of them combined
+    first checks whether any of them can match at all. Clean text,
+    which is most of it, never goes further than that.
+    """
+    def __init__(self, quick_fixes):
+        self.quick_fixes = quick_fixes
+        self.rules = [(regex, replace, explanation, required_literals(regex),)
+            for regex, replace, explanation in quick_fixes]
+        self.triggers = combined_searches([regex for regex, replace, explanation in quick_fixes])
+
+    def fix(self, text):
+        """ Returns the fixed text and a list of
+        (explanation, before, after) for each fix made."""
+        fixes = []
+        for trigger in self.triggers:
+            if trigger(text):
+                break
+        else:
+            return text, fixes
+        for regex, replace, explanation, literals in self.rules:
+            for literal in literals:
+                if literal not in text:
+                    break
+            else:
+                literal = None
+            if literal:
+                continue
+            new_text, count = regex.subn(replace, text)
+            if count and new_text != text:
+                fixes.append((explanation, text, new_text,))
+                text = new_text
+        return text, fixes
+
+class PatternScanner(object):
+    """ Reports which of a list of regexes match a text and where.
+
+    Each regex is searched for on its own, as re finds a single
+    rule quickly from its leading literals where a combined pattern
+    would try every rule at every position, and only if the text
+    has the literals every match of it needs.
+    """
+    def __init__(self, regexes):
+        self.regexes = regexes
+        self.rules = [(regex.search, required_literals(regex),) for regex in regexes]
+
+    def matches(self, text):
+        """ Returns the first match of each regex that matches."""
+        found = []
+        for search, literals in self.rules:
+            for literal in literals:
+                if literal not in text:
+                    break
+            else:
+                m = search(text)
+                if m is not None:
+                    found.append(m)
+        return found
+
+    def scan(self, text):
+        """ Returns (rule, start, matched text) for the first match of
+        each regex that matches, rule being the regex's pattern."""
+        return [(m.re.pattern, m.start(), m.group(0),) for m in self.matches(text)]
+
+def combined_searches(regexes):
+    """ Returns search functions that find the first match of any
+    of the regexes: one for each set of flags used, since flags
+    can't be mixed within a pattern."""
+    patterns = OrderedDict()
+    for regex in regexes:
+        patterns.setdefault(regex.flags, []).append(u'(?:{})'.format(regex.pattern))
+    return [re.compile(u'|'.join(p), flags=flags).search for flags, p in patterns.items()]
+
+class LetterFixEngine(object):
+    """ Generates the variations of a word that letter fixes can make.
+
+    Rules are applied in order. Each rule is applied, all at once and
+    one match at a time, to every variation found so far, including
+    the ones the rule itself just made. Words already seen are kept in
+    a set, so a variation costs one regex pass and a hash lookup.
+
+    max_variations: past this many, only the original word is varied
+    pruned_max_variations: the same, when impossible variations are
+    being pruned with a PrefixIndex
+    max_edits: how many rules may be stacked on one variation
+    (None for no limit)
+    """
+    def __init__(self, letter_fixes, max_variations=200, pruned_max_variations=1000, max_edits=None):
+        self.letter_fixes = letter_fixes
+        self.max_variations = max_variations
+        self.pruned_max_variations = pruned_max_variations
+        self.max_edits = max_edits
+        self.rules = []
+        for regex, replace, explanation in letter_fixes:
+            if callable(replace):
+                expand = replace
+            else:
+                # parse the template once instead of on every match
+                template = sre_parse.parse_template(replace, regex)
+                expand = lambda match, template=template: sre_parse.expand_template(template, match)
+            self.rules.append((regex, replace, expand, explanation, required_literals(regex),))
+        # where each rule could start rewriting a word,
+        # only worked out when pruning
+        self.rewriters = None
+
+    def variations(self, word, append=True, prefix_index=None):
+        """ Returns a set of (variation, varied word, explanation).
+
+        append means run through variations of variations, called
+        with false when too many transformations are happening
+
+        prefix_index: when given, variations that can no longer
+        become dictionary words are dropped as soon as they are made
+        """
+        if prefix_index is None:
+            max_variations = self.max_variations
+        else:
+            max_variations = self.pruned_max_variations
+        original = (word, '', '',)
+        changed_versions = [original,]
+        edits = {word: 0}
+        # kept because a later rule might still make a word of them
+        dead_ends = set()
+        last_rule = len(self.rules) - 1
+        for rule_idx, (regex, replace, expand, explanation, literals) in enumerate(self.rules):
+            if append:
+                # only the versions that have every character
+                # a match needs, in their current order
+                frontier = changed_versions
+                for literal in literals:
+                    frontier = [version for version in frontier if literal in version[0]]
+                if frontier is changed_versions:
+                    frontier = list(changed_versions)
+            else:
+                frontier = [original,]
+            # versions made by this rule join the frontier as we go
+            idx = 0
+            while idx < len(frontier):
+                potential_fix = frontier[idx][0]
+                idx += 1
+                depth = edits[potential_fix] + 1
+                if self.max_edits is not None and depth > self.max_edits:
+                    continue
+                # try replace all first
+                new_word, count = regex.subn(replace, potential_fix)
+                # don't bother if nothing changed
+                if count == 0:
+                    continue
+                new_versions = []
+                if new_word not in edits:
+                    new_versions.append((new_word, potential_fix, explanation,))
+                # try replacing one at a time
+                if count > 1:
+                    for match in regex.finditer(potential_fix):
+                        new_word_2 = u''.join((
+                            potential_fix[:match.start()],
+                            expand(match),
+                            potential_fix[match.end():],
+                        ))
+                        if new_word_2 not in edits:
+                            new_versions.append((new_word_2, potential_fix, explanation,))
+                for new_version in new_versions:
+                    edits[new_version[0]] = depth
+                    if prefix_index is not None:
+                        end = prefix_index.impossible_at(new_version[0])
+                        if end is not None:
+                            # rules from this one on may still vary it
+                            if not self.may_rewrite(new_version[0], end, rule_idx if append else len(self.rules)):
+                                continue
+                            dead_ends.add(new_version[0])
+                    changed_versions.append(new_version)
+                    if append and all(literal in new_version[0] for literal in literals):
+                        frontier.append(new_version)
+                # too many to vary again at the next rule: give up now
+                # instead of finishing this rule
+                if append and rule_idx < last_rule and \
+                    len(changed_versions) > max_variations:
+                    return self.variations(word, False, prefix_index)
+            # same ordering as the original implementation
+            changed_versions = list(set(changed_versions))
+        changed_versions.remove(original)
+        if dead_ends:
+            return set(v for v in changed_versions if v[0] not in dead_ends)
+        return set(changed_versions)
+
+    def may_rewrite(self, word, end, rule_idx):
+        """ Returns whether any rule from rule_idx on could rewrite
+        some of word[:end].
+
+        Until one of them does, word[:end] stays as it is, so it is
+        enough to look for a rule that could begin rewriting there now."""
+        if self.rewriters is None:
+            self.rewriters = [rewriter(edit_signature(regex, replace)) for regex, replace, explanation in self.letter_fixes]
+        for finder in self.rewriters[rule_idx:]:
+            if finder is None or finder.search(word, 0, end):
+                return True
+        return False
 
 class SimpleEnglishSpellFixer(BaseSpellFixer):
     def __init__(self):
@@ -230,12 +473,284 @@ class FrenchSpellFixer(BaseSpellFixer):
         self.propers = re.compile(u'\w[^.:!?]*?((?:[ ,-]?{}(?:\'|\w*))+)'.format(REGEX_CAPITAL), flags=re.UNICODE).findall
         self.bad_lowers =  re.compile(u'\.\W*({}\w*)'.format(REGEX_SMALL), flags=re.UNICODE).findall
 
+def required_literals(regex):
+    """ Returns the characters every match of regex must contain.
+
+    Only looks at literals that are not optional; may return
+    fewer characters than are actually required, never more."""
+    if regex.flags & re.IGNORECASE:
+        return ''
+    literals = []
+    def walk(items):
+        for op, av in items:
+            if op == sre_constants.LITERAL:
+                literals.append(unichr(av))
+            elif op == sre_constants.SUBPATTERN:
+                walk(av[1])
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] > 0:
+                walk(av[2])
+    walk(sre_parse.parse(regex.pattern, regex.flags))
+    return u''.join(sorted(set(literals)))
+
+# what comes after a letter at a word boundary or not
+WORD_BOUNDARY_PATTERNS = {
+    sre_constants.AT_BOUNDARY: u'\\W',
+    sre_constants.AT_NON_BOUNDARY: u'\\w',
+}
+
+def edit_signature(regex, replace):
+    """ Returns a list of patterns, one per character, that the text
+    a rule rewrites must start with, or None if that can't be worked
+    out.
+
+    A leading group the replacement puts back unchanged (r'\1...')
+    is not part of the rewritten text. May allow more than the rule
+    can really match, never less."""
+    items = list(sre_parse.parse(regex.pattern, regex.flags))
+    if not callable(replace):
+        groups = sre_parse.parse_template(replace, regex)[0]
+        for idx, (op, av) in enumerate(items):
+            if op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                continue
+            if op == sre_constants.SUBPATTERN and groups and groups[0] == (0, av[0]):
+                items = items[idx + 1:]
+            break
+    signature = []
+    def walk(items):
+        """ Adds the positions items fix, False when the rest is unknown."""
+        for op, av in items:
+            if op == sre_constants.AT and av in WORD_BOUNDARY_PATTERNS and signature \
+                and all(c.isalnum() for c in signature[-1]):
+                # after a letter this says whether the next one is too
+                signature.append(WORD_BOUNDARY_PATTERNS[av])
+                return False
+            if op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                # zero width
+                continue
+            if op == sre_constants.LITERAL:
+                signature.append(set((unichr(av),)))
+            elif op == sre_constants.IN:
+                chars = set()
+                for in_op, in_av in av:
+                    if in_op == sre_constants.LITERAL:
+                        chars.add(unichr(in_av))
+                    elif in_op == sre_constants.RANGE and in_av[1] - in_av[0] < 1000:
+                        chars.update(unichr(c) for c in xrange(in_av[0], in_av[1] + 1))
+                    else:
+                        return False
+                signature.append(chars)
+            elif op == sre_constants.SUBPATTERN:
+                if not walk(av[1]):
+                    return False
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] > 0:
+                for _ in xrange(av[0]):
+                    if not walk(av[2]):
+                        return False
+                if av[1] != av[0]:
+                    return False
+            else:
+                return False
+        return True
+    walk(items)
+    if not signature:
+        return None
+    patterns = []
+    for chars in signature:
+        if not isinstance(chars, set):
+            patterns.append(chars)
+            continue
+        if regex.flags & re.IGNORECASE:
+            chars.update([c.lower() for c in chars] + [c.upper() for c in chars])
+        patterns.append(u'[{}]'.format(u''.join(
+            u'\\' + c if c in u'\\]^-' else c for c in sorted(chars))))
+    return patterns
+
+def rewriter(signature):
+    """ Returns a regex finding where text matching signature could
+    start, even if cut short by the end of the text, or None if it
+    could start anywhere."""
+    if signature is None:
+        return None
+    pattern = u''
+    for position in reversed(signature):
+        pattern = u'{}(?:$|{})'.format(position, pattern) if pattern else position
+    return re.compile(pattern, flags=re.UNICODE)
+
+class PrefixIndex(object):
+    """ Sorted, lower cased word list answering whether any
+    dictionary word starts with a given string.
+
+    Words are indexed in pieces split at hyphens and apostrophes,
+    since spell checkers may accept the pieces on their own.
+    """
+    def __init__(self, words=()):
+        pieces = set()
+        for word in words:
+            pieces.update(self.pieces(word))
+        pieces.discard(u'')
+        self.words = sorted(pieces)
+
+    def pieces(self, word):
+        return word_pieces(_decode(word).lower())
+
+    def add(self, word):
+        for piece in self.pieces(word):
+            idx = bisect_left(self.words, piece)
+            if piece and (idx == len(self.words) or self.words[idx] != piece):
+                insort(self.words, piece)
+
+    def has_prefix(self, prefix):
+        idx = bisect_left(self.words, prefix)
+        return idx < len(self.words) and self.words[idx].startswith(prefix)
+
+    def impossible_at(self, text):
+        """ Returns the end of the shortest start of a word in text
+        that no dictionary word begins with, None if there is none."""
+        if isinstance(text, str):
+            text = _decode(text)
+        for match in dictionary_word_matches(text):
+            start = match.start()
+            for piece in self.pieces(match.group(0)):
+                if not self.has_prefix(piece):
+                    # every start longer than an impossible one is too
+                    low, high = 1, len(piece)
+                    while low < high:
+                        middle = (low + high) // 2
+                        if self.has_prefix(piece[:middle]):
+                            low = middle + 1
+                        else:
+                            high = middle
+                    return start + low
+                start += len(piece) + 1
+        return None
+
+class VerdictCache(object):
+    """ Bounded least-recently-used map of token to spell check verdict.
+
+    Keeps count of hits and misses so the savings can be reported.
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.verdicts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """ Returns the verdict for key or None if not cached."""
+        try:
+            verdict = self.verdicts.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.verdicts[key] = verdict
+        self.hits += 1
+        return verdict
+
+    def put(self, key, verdict):
+        self.verdicts.pop(key, None)
+        self.verdicts[key] = verdict
+        if len(self.verdicts) > self.maxsize:
+            self.verdicts.popitem(last=False)
+
+    def clear(self):
+        self.verdicts.clear()
+
+    def __len__(self):
+        return len(self.verdicts)
+
 class BaseSpellChecker(object):
     
     def __init__(self):
-        self.log_file = 'automatic_fixes.log'
+        if JSON_FIX_LOG:
+            self.log_file = 'automatic_fixes.jsonl'
+        else:
+            self.log_file = 'automatic_fixes.log'
         self.format_string = u'{:30} {:30} {:30} {:30}\n'
+        self.fix_log_sink = None
+        # (page, line) being worked on, for the fix log
+        self.location = None
         self.line_join_fixes = {}
+        self.verdict_cache = VerdictCache()
+        self.dict_revision = 0
+        # PrefixIndex over the accepted words, if the backend has one
+        self.prefix_index = None
+
+    def check_line(self, line):
+        """ Returns the misspelled words in line.
+
+        Each space-separated token is only sent to the backend
+        the first time it is seen."""
+        tokens = line.split()
+        verdicts = self.token_verdicts(tokens)
+        bad_words = []
+        for token in tokens:
+            bad_words.extend(verdicts[token])
+        return bad_words
+
+    def check_many(self, words):
+        """ Returns a list of booleans aligned with words,
+        True where the word passes spell check.
+
+        Every unseen token is sent to the backend in one batch."""
+        verdicts = self.token_verdicts([t for w in words for t in w.split()])
+        return [not any(verdicts[t] for t in w.split()) for w in words]
+
+    def token_verdicts(self, tokens):
+        """ Returns a dictionary of token to its misspelled parts,
+        asking check_words only about tokens not in the cache."""
+        lang = getattr(self, 'lang', None)
+        verdicts = {}
+        unchecked = []
+        for token in tokens:
+            if token in verdicts:
+                continue
+            verdict = self.verdict_cache.get((lang, self.dict_revision, token,))
+            verdicts[token] = verdict
+            if verdict is None:
+                unchecked.append(token)
+        if unchecked:
+            for token, verdict in zip(unchecked, self.check_words(unchecked)):
+                verdict = tuple(verdict)
+                self.verdict_cache.put((lang, self.dict_revision, token,), verdict)
+                verdicts[token] = verdict
+        return verdicts
+
+    def check_words(self, words):
+        """ Returns a list with the misspelled parts of each token.
+
+        Backends that can stream should override this."""
+        return [self.check_word(w) for w in words]
+
+    def check_word(self, word):
+        """ Returns the misspelled parts of a single token.
+
+        Implemented by subclasses."""
+        raise NotImplementedError()
+
+    def before_fork(self):
+        """ Called before starting worker processes so they
+        inherit no open connections or unsaved work."""
+        self.flush()
+
+    def after_fork(self):
+        """ Called in a child process so it does not share
+        pipes or connections with its parent."""
+        if self.fix_log_sink:
+            self.fix_log_sink.discard()
+
+    def flush(self):
+        """ Saves anything the checker is holding in memory."""
+        if self.fix_log_sink:
+            self.fix_log_sink.flush()
+
+    def cache_info(self):
+        """ Returns hits, misses and current size of the verdict cache."""
+        return self.verdict_cache.hits, self.verdict_cache.misses, len(self.verdict_cache)
+
+    def dictionary_changed(self):
+        """ Drops verdicts made against the old personal dictionary."""
+        self.dict_revision += 1
+        self.verdict_cache.clear()
 
     def strip_garbage(self, word):
         """ Removes words useless for proper name comparison."""
@@ -248,34 +763,40 @@ class BaseSpellChecker(object):
 
     def strict_check(self, line):
         """ Takes a string and returns an array of strict matches."""
-        strict_matches = set()
-        for regex in self.fixer.strict_checks:
-            m = regex.search(line)
-            if m:
+        return set([m.group(0) for m in self.fixer.scanner(self.fixer.strict_checks).matches(line)])
 
-#               print regex.pattern
-                strict_matches.add(m.group(0))
-
-        return strict_matches
+    def strict_findings(self, line):
+        """ Returns (rule, start, matched text) for each strict check
+        the line fails."""
+        return self.fixer.scanner(self.fixer.strict_checks).scan(line)
 
     def quick_fix(self, word):
         """ Takes a string and returns the 'quick fix' version."""
-        new_word = word
-        for regex, replace, explanation in self.fixer.quick_fixes:
-            new_word = re.sub(regex, replace, word)
-            if new_word != word:
-                self.log_fix('quick_fix', explanation, word, new_word)
-                word = new_word
-        return new_word
+        return self.quick_fix_lines([word,])[0]
+
+    def quick_fix_lines(self, lines, locations=None):
+        """ Returns the 'quick fix' version of each line.
+
+        locations: (page, line) of each line, for the fix log"""
+        engine = self.fixer.quick_fix_engine()
+        fixed_lines = []
+        for idx, line in enumerate(lines):
+            fixed_line, line_fixes = engine.fix(line)
+            fixed_lines.append(fixed_line)
+            if line_fixes:
+                location = locations[idx] if locations else self.location
+                for explanation, before, after in line_fixes:
+                    self.fix_log().write('quick_fix', explanation, before, after, location)
+        return fixed_lines
 
     def odd_punctuation(self, line):
         # Note: can return True even if would be fixed by fix spelling
-        odd = set()
-        for regex in self.fixer.odd_punctuation:
-            m = regex.search(line)
-            if m:
-                odd.add(m.group(0))
-        return odd
+        return set([m.group(0) for m in self.fixer.scanner(self.fixer.odd_punctuation).matches(line)])
+
+    def odd_punctuation_findings(self, line):
+        """ Returns (rule, start, matched text) for each kind of
+        odd punctuation in the line."""
+        return self.fixer.scanner(self.fixer.odd_punctuation).scan(line)
 
 
     def hyphenated_versions(self, word, min_chars=3):
@@ -289,8 +810,11 @@ class BaseSpellChecker(object):
                 '-',
                 word[idx + 1:]
             )
-            if not '--' in new_word:
-                hyphenates.append((new_word, 'hyphen-at-{}'.format(idx),))
+            if '--' in new_word:
+                continue
+            if self.prefix_index and self.prefix_index.impossible_at(new_word) is not None:
+                continue
+            hyphenates.append((new_word, 'hyphen-at-{}'.format(idx),))
         return hyphenates
 
     def hyphenate(self, word, min_chars=3):
@@ -310,8 +834,7 @@ class BaseSpellChecker(object):
 
 	if fixed_versions:
             fixed_words = [t[0] for t in fixed_versions]
-            bad_versions = [_decode(v) for v in self.check_line(' '.join(fixed_words))]
-            good_versions = [item for item in fixed_words if item not in bad_versions]
+            good_versions = [w for w, good in zip(fixed_words, self.check_many(fixed_words)) if good]
         else:
             good_versions = []
         if good_versions:
@@ -357,17 +880,8 @@ class BaseSpellChecker(object):
         as two words by the spell checker, any thing using this should probably
         split the results.
         """
-        self.output_dir = 'working'
-        with codecs.open('{}/hold_words.tmp'.format(self.output_dir), mode='wb', encoding='utf-8') as f:
-            f.write(u' xNoTPassx '.join(to_check))
-        # aspell maintains order of bad words, but does not return good words
-        # we therefore need some way to indicate that nothing was returned
-        # (that is the word was good) in a given area.  This is noted by
-        # a repetition of xNoTPassx
-        # We then split on that, which leaves empty strings in the space
-        # that have good words (which fail a boolean test in python)
-        failed_versions = self.check_document('{}/hold_words.tmp'.format(self.output_dir))
-        return u''.join([_decode(w) for w in failed_versions]).split(u'xNoTPassx')
+        verdicts = self.token_verdicts([t for w in to_check for t in w.split()])
+        return [u''.join([_decode(b) for t in w.split() for b in verdicts[t]]) for w in to_check]
 
     def good_and_bad(self, to_check):
         """ Given an array (order is important) of words returns good and bad collections.
@@ -375,11 +889,10 @@ class BaseSpellChecker(object):
         First is a collection of correctly spelled words. 
         Second is a collection of misspelled words.
         """
-        failed_words = self.failed_words(to_check)
         good_versions = []
         bad_versions = []
-        for idx, w in enumerate(to_check):
-            if not failed_words[idx]:
+        for w, good in zip(to_check, self.check_many(to_check)):
+            if good:
                 good_versions.append(w)
             else:
                 bad_versions.append(w)
@@ -390,40 +903,7 @@ class BaseSpellChecker(object):
         append means run through variations of variations, called
         with false when too many transformations are happening
         """
-	changed_versions = [(word, '', ''),]
-	versions_to_fix = [(word, '', ''),]
-        for regex, replace, explanation in self.fixer.letter_fixes:
-            if append:
-                versions_to_fix = changed_versions
-            if len(versions_to_fix) > 200:
-                return self.transformed_variations(word, False)
-            
-            for potential_fix, old_word, provided_explanation in versions_to_fix:
-                existing_words = [group[0] for group in changed_versions]
-                # try replace all first
-                new_word, count = regex.subn(replace, potential_fix)
-                # don't bother if nothing changed
-                if count == 0:
-                    continue
-                if new_word not in existing_words:
-                    changed_versions.append((new_word, potential_fix, explanation,))
-                # try replacing one at a time
-                if count > 1: # and u'\\' not in replace:
-                    for match in regex.finditer(potential_fix):
-
-                        new_word_2 = u'{}{}{}'.format(
-                            potential_fix[:match.start()],
-                            match.expand(replace),
-                            potential_fix[match.end():]
-                        )
-                        if new_word_2 not in existing_words:
-                            changed_versions.append((new_word_2, potential_fix, explanation,))
-            changed_versions = list(set(changed_versions))
-                # try replacing between one and all - TODO
-        changed_versions.remove((word, '', ''))
-#       for hyphenate in self.hyphenated_versions(word):
-#           changed_versions.append((hyphenate[0], word, hyphenate[1],))
-        return set(changed_versions)
+        return self.fixer.letter_fix_engine().variations(word, append, self.prefix_index)
 
     def fix_spelling(self, word):
         """ Run through the fixer's fixes and return
@@ -440,16 +920,8 @@ class BaseSpellChecker(object):
         good_versions = []
 	if changed_versions:
             changed_words = [t[0] for t in changed_versions]
-            # aspell maintains order of bad words, but does not return good words
-            # we therefore need some way to indicate that nothing was returned
-            # (that is the word was good) in a given area.  This is noted by
-            # a repetition of xNoTPassx
-            # We then split on that, which leaves empty strings in the space
-            # that have good words (which fail a boolean test in python)
-            failed_versions = [_decode(v) for v in self.check_line(u' xNoTPassx '.join(changed_words))]
-            words_if_bad = ''.join(failed_versions).split(u'xNoTPassx')
-            for idx, w in enumerate(changed_words):
-                if not words_if_bad[idx]:
+            for w, good in zip(changed_words, self.check_many(changed_words)):
+                if good:
                     good_versions.append(w)
         if good_versions:
             explanation = [t[1] for t in changed_versions if t[0] == good_versions[0]][0]
@@ -489,8 +961,23 @@ class BaseSpellChecker(object):
         
 
     def log_fix(self, context, expression, old_word, new_word):
-        with codecs.open(self.log_file, mode='ab', encoding='utf-8') as f:
-            f.write(self.format_string.format(context, expression, old_word, new_word))
+        self.fix_log().write(context, expression, old_word, new_word, self.location)
+
+    def fix_log(self):
+        """ Returns the FixLog for the current log file."""
+        if not self.fix_log_sink or self.fix_log_sink.path != self.log_file:
+            if self.fix_log_sink:
+                self.fix_log_sink.flush()
+            self.fix_log_sink = FixLog(self.log_file, None if self.log_file.endswith('.jsonl') else self.format_string)
+        return self.fix_log_sink
+
+    def set_location(self, page_nbr, line_nbr):
+        """ Tags the fixes that follow with where they were made."""
+        self.location = (page_nbr, line_nbr,)
+
+    def clear_location(self):
+        """ Stops tagging fixes, e.g. once a page is done."""
+        self.location = None
 
 
     def fix_line(self, line):
@@ -524,16 +1011,17 @@ class BaseSpellChecker(object):
 
 class StubSpellChecker(BaseSpellChecker):
     def __init__(self, correct_words, line_join_fixes={}):
-	super(BaseSpellChecker, self).__init__()
+        super(StubSpellChecker, self).__init__()
         self.correct_words = correct_words
         self.fixer = BaseSpellFixer()
 	self.log_file = '/var/tmp/test.log'
 	self.format_string = ''
         self.line_join_fixes = line_join_fixes
 
-    def check_line(self, line):
-        words = re.split('\s+', line, flags=re.UNICODE)
-        return [word for word in words if word and not word in self.correct_words]
+    def check_word(self, word):
+        if word in self.correct_words:
+            return []
+        return [word,]
 
 
 
@@ -545,23 +1033,237 @@ class StubSpellChecker(BaseSpellChecker):
         return bad_words
 
                                  
+class AspellPipe(object):
+    """ Long-lived 'aspell -a' process.
+
+    Started once and fed one line at a time, so checking a word
+    does not cost a fork.
+    """
+    def __init__(self, command):
+        self.command = command
+        self.process = None
+
+    def start(self):
+        self.process = Popen(self.command, stdin=PIPE, stdout=PIPE)
+        # first line is the version banner
+        self.process.stdout.readline()
+
+    def close(self):
+        if self.process:
+            try:
+                self.process.stdin.close()
+                self.process.wait()
+            except (IOError, OSError):
+                pass
+            self.process = None
+
+    def check_line(self, line):
+        """ Returns the misspelled words in line, in order."""
+        return self.check_lines([line])[0]
+
+    def check_lines(self, lines, chunk_size=64):
+        """ Returns a list with the misspelled words of each line.
+
+        Lines are written chunk_size at a time before reading
+        the answers, which keeps both pipes from filling up."""
+        results = []
+        for start in xrange(0, len(lines), chunk_size):
+            chunk = lines[start:start + chunk_size]
+            if not self.process or self.process.poll() is not None:
+                self.start()
+            for line in chunk:
+                if isinstance(line, unicode):
+                    line = line.encode('utf-8')
+                # '^' keeps aspell from reading the line as a command
+                self.process.stdin.write('^{}\n'.format(re.sub(r'[\r\n]+', ' ', line)))
+            self.process.stdin.flush()
+            for line in chunk:
+                results.append(self.read_result())
+        return results
+
+    def read_result(self):
+        """ Reads the answer for one line."""
+        bad_words = []
+        while self.process:
+            result = self.process.stdout.readline()
+            if not result:
+                # aspell died; next call will restart it
+                self.process = None
+                break
+            result = result.rstrip('\n')
+            if not result:
+                break
+            # & word count offset: suggestions / # word offset
+            if result[0] in '&#':
+                bad_words.append(result.split(' ', 2)[1])
+        return bad_words
+
+class FixLog(object):
+    """ Fix log entries kept in memory and appended to the log file
+    every batch_size entries, every interval seconds and at exit.
+
+    format_string: how to write (context, rule, before, after);
+    None writes a JSON object per line, with page and line too.
+    """
+    def __init__(self, path, format_string=None, batch_size=500, interval=5):
+        self.path = path
+        # where path was when the first fix was logged
+        self.abs_path = os.path.abspath(path)
+        self.format_string = format_string
+        self.batch_size = batch_size
+        self.interval = interval
+        self.entries = []
+        self.last_flush = time.time()
+        _fix_logs.add(self)
+
+    def write(self, context, rule, before, after, location=None):
+        """ location: (page, line), if known."""
+        self.entries.append((context, rule, before, after, location,))
+        if len(self.entries) >= self.batch_size or time.time() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.time()
+        if not self.entries:
+            return
+        with codecs.open(self.abs_path, mode='ab', encoding='utf-8') as f:
+            for context, rule, before, after, location in self.entries:
+                if self.format_string is not None:
+                    f.write(self.format_string.format(context, rule, before, after))
+                    continue
+                page, line = location or (None, None,)
+                f.write(json.dumps(OrderedDict((
+                    ('page', page),
+                    ('line', line),
+                    ('context', context),
+                    ('rule', _decode(rule)),
+                    ('before', _decode(before)),
+                    ('after', _decode(after)),
+                )), ensure_ascii=False))
+                f.write(u'\n')
+        self.entries = []
+
+    def discard(self):
+        """ Forgets unwritten entries (e.g. ones inherited from
+        a parent process, which will write them itself)."""
+        self.entries = []
+
+    def __del__(self):
+        self.flush()
+
+# every FixLog, flushed once at exit
+_fix_logs = weakref.WeakSet()
+
+def _flush_fix_logs():
+    for fix_log in list(_fix_logs):
+        fix_log.flush()
+
+atexit.register(_flush_fix_logs)
+
+class VerdictStore(object):
+    """ Spell check verdicts saved in a sqlite file so that later
+    runs do not have to ask aspell again.
+
+    Keyed on language, hash of the dictionaries and word.
+    Writes are batched and flushed every batch_size verdicts
+    and at exit.
+    """
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        # opened when first used, so worker processes forked
+        # after close() each open their own
+        self.connection = None
+        atexit.register(self.close)
+
+    def connect(self):
+        """ Returns the connection, opening it if need be."""
+        if self.connection is None:
+            # several worker processes may write at once
+            self.connection = sqlite3.connect(self.path, timeout=60)
+            self.connection.text_factory = unicode
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS verdicts ('
+                'lang TEXT, dict_hash TEXT, word TEXT, bad_words TEXT, '
+                'PRIMARY KEY (lang, dict_hash, word))')
+            self.connection.commit()
+        return self.connection
+
+    def get(self, lang, dict_hash, word):
+        """ Returns the saved list of bad words or None if never checked."""
+        row = self.connect().execute(
+            'SELECT bad_words FROM verdicts WHERE lang = ? AND dict_hash = ? AND word = ?',
+            (lang, dict_hash, _decode(word),)).fetchone()
+        if row is None:
+            return None
+        return [w.encode('utf-8') for w in row[0].split()]
+
+    def put(self, lang, dict_hash, word, bad_words):
+        self.pending.append((lang, dict_hash, _decode(word),
+            u' '.join([_decode(w) for w in bad_words]),))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            connection = self.connect()
+            connection.executemany(
+                'INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)', self.pending)
+            connection.commit()
+            self.pending = []
+
+    def forget(self, lang, word):
+        """ Drops the saved verdicts on word, whatever the dictionaries."""
+        self.flush()
+        connection = self.connect()
+        connection.execute(
+            'DELETE FROM verdicts WHERE lang = ? AND word = ?', (lang, _decode(word),))
+        connection.commit()
+
+    def close(self):
+        self.flush()
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
 class AspellSpellChecker(BaseSpellChecker):
-    def __init__(self, lang, dict_path=None):
+    """ Checks words with a long-running aspell process.
+
+    word_list_path: optional word list used to prune impossible
+    fix candidates; it is made from aspell's main dictionary
+    ('aspell -l fr dump master | aspell -l fr expand') when it
+    is missing or older than the dictionary
+    """
+    def __init__(self, lang, dict_path=None, store_dir='working', word_list_path=None):
         super(AspellSpellChecker, self).__init__()
         self.lang = lang
         self.aspell_command = ['aspell', 'list', '-l', self.lang,]
+        pipe_command = ['aspell', '-a', '--encoding=utf-8', '--sug-mode=ultra', '-l', self.lang,]
         if dict_path and os.path.exists(dict_path):
             self.aspell_command.append('-p')
             self.aspell_command.append(dict_path)
+            pipe_command.extend(['-p', dict_path,])
             self.dict_path = dict_path
         else:
             self.dict_path = None
-        if lang[:2] == 'en':
-            self.fixer = EnglishSpellFixer()
-        elif lang[:2] == 'fr':
-            self.fixer = FrenchSpellFixer()
+        self.aspell_pipe = AspellPipe(pipe_command)
+        self.find_dictionaries()
+        self.dict_hash = self.dictionary_hash()
+        # only projects (which have a working directory) keep verdicts
+        if store_dir and os.path.isdir(store_dir):
+            self.verdict_store = VerdictStore('{}/spell_verdicts.db'.format(store_dir))
         else:
-            self.fixer = BaseSpellFixer()
+            self.verdict_store = None
+        if word_list_path and self.word_list_stale(word_list_path):
+            self.dump_word_list(word_list_path)
+        if word_list_path and os.path.exists(word_list_path):
+            # words added to the personal dictionary are fixes too
+            personal_path = self.personal_path
+            if personal_path and not os.path.exists(personal_path):
+                personal_path = None
+            self.prefix_index = PrefixIndex(load_word_list(word_list_path, personal_path))
+        self.fixer = fixer_for_lang(lang)
     
     def interactive_check(self, path):
         command = ['aspell', '-c', '-l', self.lang,]
@@ -572,17 +1274,139 @@ class AspellSpellChecker(BaseSpellChecker):
         return command
 
     def add_word(self, word):
+        """ Adds word to the personal dictionary aspell uses and
+        forgets every verdict on it."""
+        if self.personal_path:
+            if not os.path.exists(self.personal_path):
+                with codecs.open(self.personal_path, mode='wb', encoding='utf-8') as f:
+                    f.write(u'personal_ws-1.1 {} 0\n'.format(self.lang))
+            with codecs.open(self.personal_path, mode='ab', encoding='utf-8') as f:
+                f.write(_decode(word))
+                f.write(u'\n')
+        # restart so aspell re-reads the personal dictionary
+        self.aspell_pipe.close()
+        if self.prefix_index:
+            self.prefix_index.add(word)
+        if self.verdict_store:
+            self.verdict_store.forget(self.lang, word)
+        self.dict_hash = self.dictionary_hash()
+        self.dictionary_changed()
+
+    def aspell_config(self, key):
+        """ Returns the value aspell uses for a configuration key
+        (blank if aspell can't be asked)."""
+        command = ['aspell', '-l', self.lang,]
         if self.dict_path:
-            with codecs.open(self.dict_path, mode='ab', encoding='utf-8') as f:
-                f.write(word)
-                f.write('\n')
-             
-    def check_line(self, line):
-        p1 = Popen(['echo', line,], stdout=PIPE)
-        p2 = Popen(self.aspell_command, stdin=p1.stdout, stdout=PIPE)
-        p1.stdout.close()
-        o = p2.communicate()[0]
-        return o.split()
+            command.extend(['-p', self.dict_path,])
+        command.extend(['config', key,])
+        try:
+            return Popen(command, stdout=PIPE, stderr=PIPE).communicate()[0].strip()
+        except OSError:
+            return ''
+
+    def find_dictionaries(self):
+        """ Works out the personal dictionary aspell reads and writes
+        and the files of its main dictionary."""
+        self.personal_path = self.dict_path
+        if not self.personal_path:
+            personal = self.aspell_config('personal')
+            if personal:
+                self.personal_path = os.path.join(self.aspell_config('home-dir'), personal)
+        self.main_dictionaries = []
+        dict_dir = self.aspell_config('dict-dir')
+        if os.path.isdir(dict_dir):
+            # e.g. en_US.multi, en-common.rws and en_US-wo_accents-only.rws for en_US
+            prefix = re.split('[_-]', self.lang)[0]
+            self.main_dictionaries = sorted(['{}/{}'.format(dict_dir, fn)
+                for fn in os.listdir(dict_dir) if fn.startswith(prefix)])
+
+    def word_list_stale(self, path):
+        """ Whether the word list at path is missing or
+        older than a file of the main dictionary."""
+        if not os.path.exists(path):
+            return True
+        mtime = os.path.getmtime(path)
+        return any(os.path.getmtime(dictionary) > mtime
+            for dictionary in self.main_dictionaries if os.path.exists(dictionary))
+
+    def dump_word_list(self, path):
+        """ Writes every word of the main dictionary to path,
+        returning whether aspell could."""
+        tmp_path = '{}.tmp'.format(path)
+        try:
+            dump = Popen(['aspell', '--encoding=utf-8', '-l', self.lang, 'dump', 'master',], stdout=PIPE)
+            with open(tmp_path, 'wb') as f:
+                expand = Popen(['aspell', '--encoding=utf-8', '-l', self.lang, 'expand',], stdin=dump.stdout, stdout=f)
+                dump.stdout.close()
+                expand.communicate()
+            dump.wait()
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        if dump.returncode or expand.returncode:
+            os.remove(tmp_path)
+            return False
+        os.rename(tmp_path, path)
+        return True
+
+    def dictionary_hash(self):
+        """ Returns md5 of the dictionaries aspell uses: the contents
+        of the personal dictionary and the size and time of each
+        file of the main dictionary."""
+        md5 = hashlib.md5()
+        if self.personal_path and os.path.exists(self.personal_path):
+            with open(self.personal_path, 'rb') as f:
+                md5.update(f.read())
+        for path in self.main_dictionaries:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            md5.update('{} {} {}\n'.format(path, stat.st_size, stat.st_mtime))
+        return md5.hexdigest()
+
+    def check_word(self, word):
+        return self.check_words([word])[0]
+
+    def check_words(self, words):
+        results = [None] * len(words)
+        if self.verdict_store:
+            for idx, word in enumerate(words):
+                results[idx] = self.verdict_store.get(self.lang, self.dict_hash, word)
+        unchecked = [idx for idx, bad_words in enumerate(results) if bad_words is None]
+        piped = self.aspell_pipe.check_lines([words[idx] for idx in unchecked])
+        for idx, bad_words in zip(unchecked, piped):
+            results[idx] = bad_words
+            if self.verdict_store:
+                self.verdict_store.put(self.lang, self.dict_hash, words[idx], bad_words)
+        return results
+
+    def after_fork(self):
+        super(AspellSpellChecker, self).after_fork()
+        # the parent keeps talking to its own aspell
+        self.aspell_pipe.process = None
+        if self.verdict_store:
+            # before_fork closed it; if it didn't, leave the parent's connection alone
+            self.verdict_store.connection = None
+            self.verdict_store.pending = []
+
+    def before_fork(self):
+        super(AspellSpellChecker, self).before_fork()
+        if self.verdict_store:
+            self.verdict_store.close()
+
+    def flush(self):
+        super(AspellSpellChecker, self).flush()
+        if self.verdict_store:
+            self.verdict_store.flush()
+
+    def close(self):
+        """ Stops the aspell process and saves pending verdicts."""
+        self.aspell_pipe.close()
+        if self.verdict_store:
+            self.verdict_store.close()
+            self.verdict_store = None
 
     def check_document(self, filename):
         p1 = Popen(['cat', filename,], stdout=PIPE)
@@ -591,22 +1415,103 @@ class AspellSpellChecker(BaseSpellChecker):
         o = p2.communicate()[0]
         return o.split()
 
+class DictionarySpellChecker(BaseSpellChecker):
+    """ Checks words against an in-memory word list instead of aspell.
+
+    word_list_path: one word per line
+    (e.g. the output of 'aspell -l fr dump master')
+    dict_path: aspell personal dictionary (dict.<lang>.pws)
+    """
+    def __init__(self, lang, word_list_path, dict_path=None):
+        super(DictionarySpellChecker, self).__init__()
+        self.lang = lang
+        if dict_path and os.path.exists(dict_path):
+            self.dict_path = dict_path
+        else:
+            self.dict_path = None
+        self.words = set(load_word_list(word_list_path, self.dict_path))
+        self.prefix_index = PrefixIndex(self.words)
+        self.fixer = fixer_for_lang(lang)
+
+    def known(self, word):
+        """ Accepts the word as listed, capitalized or in all caps."""
+        if word in self.words:
+            return True
+        if word[0].isupper() and word[0].lower() + word[1:] in self.words:
+            return True
+        if word.isupper():
+            return word.lower() in self.words or word.capitalize() in self.words
+        return False
+
+    def check_word(self, word):
+        bad_words = []
+        for w in dictionary_words(_decode(word)):
+            if self.known(w):
+                continue
+            # like aspell, hyphenated words are checked piece by piece
+            bad_words.extend(part for part in w.split('-') if not self.known(part))
+        return bad_words
+
+    def check_document(self, filename):
+        bad_words = []
+        with codecs.open(filename, mode='rb', encoding='utf-8') as f:
+            for l in f:
+                bad_words.extend(self.check_line(l))
+        return bad_words
+
+    def add_word(self, word):
+        if self.dict_path:
+            with codecs.open(self.dict_path, mode='ab', encoding='utf-8') as f:
+                f.write(word)
+                f.write('\n')
+        self.words.add(word)
+        self.prefix_index.add(word)
+        self.dictionary_changed()
+
 class AlreadyCheckedSpellChecker(BaseSpellChecker):
     """ For when fixing things is alread done.
     Will check for odd punctuation.
     """
     def __init__(self, fixer=BaseSpellFixer()):
+        super(AlreadyCheckedSpellChecker, self).__init__()
         self.fixer = fixer
     def check_line(self, line):
         # Always say it is good
         return False
+    def check_word(self, word):
+        return []
     def quick_fix(self, word):
         return word
+    def quick_fix_lines(self, lines, locations=None):
+        return list(lines)
     def fix_spelling(self, word):
         return word
     def hyphenate(self, word):
         return word
 
+def fixer_for_lang(lang):
+    """ Returns the spell fixer for an aspell language code."""
+    if lang[:2] == 'en':
+        return EnglishSpellFixer()
+    elif lang[:2] == 'fr':
+        return FrenchSpellFixer()
+    else:
+        return BaseSpellFixer()
+
+def load_word_list(*paths):
+    """ Returns the words in the given word lists,
+    one or more words per line. Blank paths are skipped."""
+    words = []
+    for path in paths:
+        if not path:
+            continue
+        with codecs.open(path, mode='rb', encoding='utf-8') as f:
+            for l in f:
+                # skip the personal dictionary header
+                if not l.startswith('personal_ws-'):
+                    words.extend(l.split())
+    return words
+
 def _decode(word):
     """ Returns the word maybe decoded to utf-8."""
     try:
@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+from collections import defaultdict
 import Image, ImageDraw
 import unittest
 import os
@@ -27,6 +28,37 @@ class DocumentBuilderTester(unittest.TestCase):
         for test, expected in test_expected('{}/test_spellcheck/fix_spelling'.format(PATH)):
             self.assertEqual(db.fixed_words((test,)).values()[0], [expected,])
 
+    def test_fixed_words_pool(self):
+        sc = spell_checker.StubSpellChecker([
+            'Cantrip',
+            'government',
+            'bomb',
+            'born',
+            'bod',
+            "he'll",
+            'What',
+            'hiss',
+            'different',
+        ])
+        bad_words = [test for test, expected in test_expected('{}/test_spellcheck/fix_spelling'.format(PATH))]
+        serial = document_builder.SpellcheckDocMaker(sc).fixed_words(bad_words)
+        pooled = document_builder.SpellcheckDocMaker(sc, workers=3).fixed_words(bad_words)
+        self.assertEqual(serial, pooled)
+        self.assertEqual(len(bad_words), len(pooled))
+
+    def test_fixed_words_one_batch(self):
+        sc = spell_checker.StubSpellChecker(['bomb', 'tomb',])
+        batches = []
+        check_words = sc.check_words
+        def recording_check_words(words):
+            batches.append(words)
+            return check_words(words)
+        sc.check_words = recording_check_words
+        db = document_builder.SpellcheckDocMaker(sc)
+        self.assertEqual({'bornb': ['bomb',], 'tornb': ['tomb',],}, db.fixed_words(['bornb', 'tornb',]))
+        self.assertEqual(1, len(batches))
+        self.assertEqual(len(batches[0]), len(set(batches[0])))
+
         
     def test_checkables(self):
         to_test = (
@@ -44,6 +76,25 @@ class DocumentBuilderTester(unittest.TestCase):
         for word1, word2, expected in to_test:
             self.assertEqual(spell_checker.joinables(word1, word2), expected)
 
+    def test_remove_page_headers(self):
+        db = document_builder.SpellcheckDocMaker(spell_checker.StubSpellChecker([]), '{}/test_extract'.format(PATH))
+        path = '{}/test_extract/12.txt'.format(PATH)
+        with open(path, 'w') as f:
+            f.write('noise\nTHUS WAS ADONIS MURDERED\nthe first line\n\nthe last line\n12\n')
+        footer_map = defaultdict(lambda : 'NOT A LINE')
+        footer_map['12.txt'] = '12'
+        try:
+            db.remove_page_headers(path, {'12.txt': 'THUS WAS ADONIS MURDERED'}, footer_map)
+            with open(path, 'r') as f:
+                self.assertEqual('the first line\n\nthe last line\n', f.read())
+            # without a header, only the footer goes
+            db.remove_page_headers(path, {}, defaultdict(lambda : 'the last line'))
+            with open(path, 'r') as f:
+                self.assertEqual('the first line\n\n', f.read())
+            self.assertRaises(Exception, db.remove_page_headers, path, {'12.txt': 'NOT THERE'}, footer_map)
+        finally:
+            os.remove(path)
+
     def test_page_info(self):
         pi = document_builder.PageInfo('{}/test_paragraphs/images/straight.pbm'.format(PATH),
                                         '{}/test_paragraphs/text/straight.txt'.format(PATH))
@@ -60,6 +111,26 @@ class DocumentBuilderTester(unittest.TestCase):
         page_lines = pi.line_guess()
         self.assertEquals(len(pi.lines), len(page_lines))
         
+    @unittest.skipUnless(document_builder.numpy, 'numpy not installed')
+    def test_numpy_pixel_lines(self):
+        fields = ('threshold', 'left_margin', 'blank', 'full_length', 'density',)
+        for name in ('straight', 'slanted', 'maigret', 'test',):
+            pi = document_builder.PageInfo('{}/test_paragraphs/images/{}.pbm'.format(PATH, name),
+                                            '{}/test_paragraphs/text/straight.txt'.format(PATH))
+            fast = [[getattr(pl, f) for f in fields] for pl in pi.pixel_lines]
+            pi.load_image_data(use_numpy=False)
+            slow = [[getattr(pl, f) for f in fields] for pl in pi.pixel_lines]
+            self.assertEqual(slow, fast, name)
+            self.assertEqual([[type(v) for v in row] for row in slow], [[type(v) for v in row] for row in fast])
+        im = Image.new('L', (6, 4), 128)
+        im.putdata([255, 0, 7, 0, 255, 0,
+                    0, 0, 255, 9, 0, 255,
+                    128, 128, 128, 128, 128, 128,
+                    255, 255, 255, 255, 255, 0])
+        expected = [document_builder.PixelLineInfo(list(im.getdata())[i*6:(i+1)*6]) for i in xrange(4)]
+        self.assertEqual([[getattr(pl, f) for f in fields] for pl in expected],
+                         [[getattr(pl, f) for f in fields] for pl in document_builder.pixel_line_infos(im)])
+
     def test_line_image(self):
         test_image = Image.open('{}/test_paragraphs/images/test.pbm'.format(PATH))
         expected_pixels = []
@@ -4,6 +4,7 @@ import unittest
 import os
 import shutil
 import sys
+import tempfile
 PATH = os.path.split(os.path.realpath(__file__))[0]
 sys.path.append('{}/..'.format(PATH))
 
@@ -29,6 +30,137 @@ class LineManagerTester(unittest.TestCase):
         self.assertEqual(['1', '2', '3',], lm.page_numbers)
 
 
+    def test_next_line_to_check(self):
+        lm = LineManager(StubSpellChecker(('the', 'rains', 'in', 'fall',)), verbose=False)
+        lm.load('navigation_test')
+        page_nbr, line, errors = lm.next_line_to_check('0', None, strict=True)
+        self.assertEqual(('1', 'in sp4in', ['4',],), (page_nbr, line.text, errors,))
+        page_nbr, line, errors = lm.next_line_to_check(page_nbr, line, strict=True)
+        self.assertEqual(('2', 'm4inly',), (page_nbr, line.text,))
+        self.assertEqual(('0', None, [],), lm.next_line_to_check(page_nbr, line, strict=True))
+        self.assertEqual('2', lm.next_line_to_check('2', None, strict=True)[0])
+        self.assertEqual(('0', None, [],), lm.next_line_to_check('0', None, strict=True, skips=['4',]))
+        # edits are picked up without rescanning or telling the manager
+        last_line = lm.pages['3'].lines[0]
+        last_line.set_text('the 3 rains')
+        self.assertEqual(('3', last_line, ['3',],), lm.next_line_to_check(page_nbr, line, strict=True))
+        first_bad = lm.pages['1'].lines[1]
+        first_bad.set_text('in spain')
+        self.assertEqual('2', lm.next_line_to_check('0', None, strict=True)[0])
+        page_nbr, line, errors = lm.next_line_to_check('0', None)
+        self.assertEqual(('1', 'in spain', ['spain',],), (page_nbr, line.text, errors,))
+
+    def test_line_positions(self):
+        lm = LineManager(StubSpellChecker(()), verbose=False)
+        lm.load('navigation_test')
+        page_nbr, line = lm.next_line('0', None)
+        texts = []
+        while line:
+            texts.append((page_nbr, line.text,))
+            page_nbr, line = lm.next_line(page_nbr, line)
+        self.assertEqual([('1', 'the rains',), ('1', 'in sp4in',), ('2', 'fall',), ('2', 'm4inly',), ('3', 'the rains',),], texts)
+        last_line = lm.pages['3'].lines[0]
+        self.assertEqual(('2', lm.pages['2'].lines[1],), lm.previous_line('3', last_line))
+        self.assertEqual(('2', lm.pages['2'].lines[0],), lm.previous_line('2', lm.pages['2'].lines[1]))
+        first_line = lm.pages['1'].lines[0]
+        self.assertEqual(('1', first_line,), lm.previous_line('1', first_line))
+        # a line from another page isn't found
+        self.assertEqual(('2', first_line,), lm.previous_line('2', first_line))
+        before_line, after_line, idx = lm.line_context('1', lm.pages['1'].lines[1])
+        self.assertEqual(('the rains', '[PAGE END]', 1,), (before_line.text, after_line.text, idx,))
+        before_line, after_line, idx = lm.line_context('2', first_line)
+        self.assertEqual(('[PAGE BEGIN]', '[PAGE END]', 0,), (before_line.text, after_line.text, idx,))
+
+    def test_lazy_load(self):
+        eager = LineManager(StubSpellChecker(()), verbose=False)
+        eager.load('navigation_test')
+        lm = LineManager(StubSpellChecker(()), verbose=False)
+        lm.load('navigation_test', lazy=True, max_pages=1)
+        self.assertEqual([], lm.pages.loaded.keys())
+        self.assertEqual(eager.page_numbers, lm.page_numbers)
+        self.assertEqual(eager.average_length, lm.average_length)
+        self.assertEqual(eager.average_lines_per_page, lm.average_lines_per_page)
+        page_nbr, line, errors = lm.next_line_to_check('0', None, strict=True)
+        self.assertEqual(('1', 'in sp4in', ['4',],), (page_nbr, line.text, errors,))
+        line.set_text('in spain')
+        page_nbr, line, errors = lm.next_line_to_check(page_nbr, line, strict=True)
+        self.assertEqual(('2', 'm4inly',), (page_nbr, line.text,))
+        lm.hold_line(page_nbr, line)
+        self.assertEqual(('3', 'the rains',), (lm.next_line('2', line)[0], lm.next_line('2', line)[1].text,))
+        # the changed page is pinned, the one whose line is held is kept
+        self.assertEqual(['1',], lm.pages.pinned.keys())
+        self.assertEqual(['3', '2',], lm.pages.loaded.keys())
+        page_nbr, line = lm.previous_line('2', lm.pages['2'].lines[0])
+        self.assertEqual(('1', 'in spain',), (page_nbr, line.text,))
+
+    def test_lazy_write_pages(self):
+        dir_ = tempfile.mkdtemp()
+        try:
+            page_dir = '{}/pages'.format(dir_)
+            shutil.copytree('navigation_test', page_dir)
+            lm = LineManager(StubSpellChecker(()), verbose=False)
+            lm.load(page_dir, lazy=True, max_pages=1)
+            lm.pages['1'].lines[1].set_text('in spain')
+            lm.write_pages(page_dir, False)
+            lm = LineManager(StubSpellChecker(()), verbose=False)
+            lm.load(page_dir)
+            self.assertEqual(['the rains', 'in spain', 'fall', 'm4inly', 'the rains',],
+                [line.text for page_nbr in lm.page_numbers for line in lm.pages[page_nbr]])
+        finally:
+            shutil.rmtree(dir_)
+
+    def test_lazy_held_line(self):
+        dir_ = tempfile.mkdtemp()
+        try:
+            page_dir = '{}/pages'.format(dir_)
+            shutil.copytree('navigation_test', page_dir)
+            lm = LineManager(StubSpellChecker(()), verbose=False)
+            lm.load(page_dir, lazy=True, max_pages=1)
+            line = lm.pages['1'].lines[1]
+            lm.hold_line('1', line)
+            lm.pages['2']
+            lm.pages['3']
+            self.assertEqual(['3', '1',], lm.pages.loaded.keys())
+            # references the cache doesn't know about don't keep a page
+            kept = lm.pages['2'].lines[0]
+            lm.pages['3']
+            self.assertEqual(['3', '1',], lm.pages.loaded.keys())
+            line.set_text('in spain')
+            lm.hold_line('3', lm.pages['3'].lines[0])
+            lm.pages['2']
+            self.assertEqual(['1',], lm.pages.pinned.keys())
+            self.assertEqual(['2', '3',], lm.pages.loaded.keys())
+            lm.hold_line('3', None)
+            lm.pages['1']
+            lm.pages['2']
+            self.assertEqual(['2',], lm.pages.loaded.keys())
+            lm.write_pages(page_dir, False)
+            with open('{}/1.txt'.format(page_dir), 'rb') as f:
+                self.assertEqual(['the rains', 'in spain',], f.read().splitlines())
+        finally:
+            shutil.rmtree(dir_)
+
+    def test_fix_lines_location(self):
+        dir_ = tempfile.mkdtemp()
+        try:
+            lm = LineManager(StubSpellChecker(('the', 'rains', 'in', 'fall',)), verbose=False)
+            lm.spell_checker.log_file = '{}/automatic_fixes.log'.format(dir_)
+            lm.load('navigation_test')
+            lm.fix_lines()
+            # fixes made after the pages are done aren't put on their last line
+            self.assertEqual(None, lm.spell_checker.location)
+        finally:
+            shutil.rmtree(dir_)
+
+    def test_next_value(self):
+        lm = LineManager(StubSpellChecker(()), verbose=False)
+        lm.load('navigation_test')
+        page_nbr, line, found = lm.next_value('r.ins', '0', None)
+        self.assertEqual(('1', 'the rains', ('rains',),), (page_nbr, line.text, found,))
+        page_nbr, line, found = lm.next_value('r.ins', page_nbr, line)
+        self.assertEqual(('3', 'the rains',), (page_nbr, line.text,))
+        self.assertEqual(('0', None, [],), lm.next_value('r.ins', page_nbr, line))
+
     def test_last_word(self):
         for test, expected in test_expected('last_word'):
             line = Line(test, 1, StubSpellChecker(()))
@@ -5,6 +5,7 @@ import os
 import shutil
 import subprocess
 import sys
+import tempfile
 PATH = os.path.split(os.path.realpath(__file__))[0]
 
 import process_pdf as process_pdf
@@ -32,6 +33,27 @@ class PdfProcessorTest(unittest.TestCase):
                 self.assertEqual(4, len([fn for fn in os.listdir('images/raw/two')]))
                 shutil.rmtree('images')
 
+    def test_source_files(self):
+        os.chdir('{}/test_extract'.format(PATH))
+        pdf_processor = process_pdf.PdfProcessor()
+        self.assertEqual([
+            ('{}/test_extract/pdfs/one.pdf'.format(PATH), 'one',),
+            ('{}/test_extract/pdfs/two.pdf'.format(PATH), 'two',),
+        ], pdf_processor.source_files(('pdf',)))
+        self.assertEqual([], pdf_processor.source_files(('tiff', 'tif',)))
+
+    def test_remove_blank_lines(self):
+        os.chdir('{}/test_extract'.format(PATH))
+        with open('blank_lines.txt', 'w') as f:
+            f.write('one\n\ntwo\n \n\n\x0cthree\n\n')
+        try:
+            process_pdf.remove_blank_lines('blank_lines.txt')
+            with open('blank_lines.txt', 'r') as f:
+                # same as sed '/^$/d'
+                self.assertEqual('one\ntwo\n \n\x0cthree\n', f.read())
+        finally:
+            os.remove('blank_lines.txt')
+
     def test_crop(self):
         os.chdir('{}/test_crop'.format(PATH))
         try:
@@ -44,6 +66,157 @@ class PdfProcessorTest(unittest.TestCase):
         self.assertEqual(8, len([fn for fn in os.listdir('images/cropped/one')]))
         shutil.rmtree('images/cropped')
 
+    def test_crop_in_pool(self):
+        os.chdir('{}/test_crop'.format(PATH))
+        try:
+            shutil.rmtree('images/cropped')
+        except OSError:
+            pass # images/cropped already removed
+        cropped = {}
+        for workers in (1, 2,):
+            process_pdf.PdfProcessor(workers=workers).extract_pages_from_images()
+            cropped[workers] = {}
+            for fn in os.listdir('images/cropped/one'):
+                with open('images/cropped/one/{}'.format(fn), 'rb') as f:
+                    cropped[workers][fn] = f.read()
+            shutil.rmtree('images/cropped')
+        self.assertEqual(8, len(cropped[2]))
+        self.assertEqual(cropped[1], cropped[2])
+
+    def test_crop_opens_images_once(self):
+        os.chdir('{}/test_crop'.format(PATH))
+        raw_dir = '{}/test_crop/images/raw/one'.format(PATH)
+        image_heuristic = process_pdf.ImageHeuristic()
+        for fn in sorted(os.listdir(raw_dir)):
+            image_heuristic.add_image('{}/{}'.format(raw_dir, fn))
+        first_bounds = [ia.bounds() for ia in image_heuristic.image_analyzers]
+        image_heuristic.analyze()
+        # only images whose pages the fallback moves are opened again
+        expected = dict((ia.path_to_image, 1 if ia.bounds() == bounds else 2,)
+            for ia, bounds in zip(image_heuristic.image_analyzers, first_bounds))
+        opened = dict((path, 0,) for path in expected)
+        image_open = process_pdf.Image.open
+        def counting_open(path, *args):
+            opened[path] += 1
+            return image_open(path, *args)
+        process_pdf.Image.open = counting_open
+        try:
+            process_pdf.PdfProcessor(workers=1).extract_pages_from_images()
+        finally:
+            process_pdf.Image.open = image_open
+            shutil.rmtree('images/cropped')
+        self.assertEqual(expected, opened)
+
+    def test_inked_runs(self):
+        inked = process_pdf.numpy.array([0, 1, 1, 0, 1, 0, 0, 1, 1, 1, 0, 1, 1], dtype=bool)
+        # runs that reach the edge aren't closed off
+        self.assertEqual([(1, 2,), (4, 4,), (7, 9,),], process_pdf.inked_runs(inked))
+        self.assertEqual([], process_pdf.inked_runs(process_pdf.numpy.zeros(3, dtype=bool)))
+
+    def test_page_numbers(self):
+        os.chdir('{}/test_extract_text'.format(PATH))
+        pdf_processor = process_pdf.PdfProcessor(False)
+        os.chdir('images/cropped')
+        expected = [
+            ('one/one-000-a.pbm', 4,),
+            ('one/one-000-b.pbm', 5,),
+            ('two/two-000-b.pbm', 6,),
+            ('three/three-000-a.pbm', 7,),
+        ]
+        self.assertEqual(expected, pdf_processor.page_numbers())
+        self.assertEqual([('/x/{}'.format(f), n,) for f, n in expected],
+            [(f.replace(os.getcwd(), '/x'), n,) for f, n in pdf_processor.page_numbers('{}/{{}}'.format(os.getcwd()))])
+
+    def test_batches(self):
+        pdf_processor = process_pdf.PdfProcessor(False, 2)
+        pages = [('{}.pbm'.format(nbr), nbr,) for nbr in xrange(10)]
+        batches = pdf_processor.batches(pages)
+        self.assertEqual([2, 3, 2, 3,], [len(batch) for batch in batches])
+        self.assertEqual(pages, [page for batch in batches for page in batch])
+        self.assertEqual([[pages[0]], [pages[1]],], pdf_processor.batches(pages[:2]))
+        self.assertEqual([], pdf_processor.batches([]))
+
+    def test_ocr_manifest(self):
+        os.chdir('{}/test_extract_text/images/cropped'.format(PATH))
+        image_hash = process_pdf.file_hash('one/one-000-a.pbm')
+        with open('4.txt', 'w') as f:
+            f.write('knew\n')
+        try:
+            manifest = process_pdf.OcrManifest('manifest.json')
+            self.assertEqual({}, manifest.read_texts('.', 'no_clean'))
+            manifest.record('one/one-000-a.pbm', 4, image_hash, '4.txt')
+            manifest.record('one/one-000-b.pbm', 5, 'gone', '4.txt')
+            manifest.keep([image_hash,])
+            manifest.save()
+            manifest = process_pdf.OcrManifest('manifest.json')
+            self.assertEqual([image_hash,], manifest.images.keys())
+            self.assertEqual({image_hash: (4, 'knew\n', None, False,)}, manifest.read_texts('.', 'no_clean'))
+            manifest.set_cleaned(image_hash, True)
+            self.assertEqual({image_hash: (4, 'knew\n', 'knew\n', True,)}, manifest.read_texts('.', '.'))
+            # without its clean text, it is not cleaned
+            self.assertEqual({image_hash: (4, 'knew\n', None, False,)}, manifest.read_texts('.', 'no_clean'))
+            # text that isn't what was read
+            with open('4.txt', 'a') as f:
+                f.write('more\n')
+            self.assertEqual({}, manifest.read_texts('.', 'no_clean'))
+        finally:
+            for fn in ('4.txt', 'manifest.json',):
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+    def test_extract_text_after_insert(self):
+        project = tempfile.mkdtemp()
+        try:
+            shutil.copy('{}/test_extract_text/book.cnf'.format(PATH), project)
+            for dirname in ('one', 'two', 'three',):
+                shutil.copytree('{}/test_extract_text/images/cropped/{}'.format(PATH, dirname),
+                    '{}/images/cropped/{}'.format(project, dirname))
+            os.chdir(project)
+            pdf_processor = process_pdf.PdfProcessor(False, 1)
+            read = []
+            def run_tesseract_batch(pages, lang):
+                for source_file, page_nbr in pages:
+                    read.append((source_file, page_nbr,))
+                    with open('{}.txt'.format(page_nbr), 'w') as f:
+                        f.write('text of {}\n'.format(source_file))
+                return pages
+            pdf_processor.run_tesseract_batch = run_tesseract_batch
+            pdf_processor.extract_text_from_pages()
+            self.assertEqual([4, 5, 6, 7,], sorted([page_nbr for source_file, page_nbr in read]))
+            with open('text/clean/5.txt', 'w') as f:
+                f.write('edited\n')
+
+            # a rescanned page in front of the others
+            with open('images/cropped/one/one-000-a.pbm', 'rb') as f:
+                image = f.read()
+            with open('images/cropped/one/one-000-0.pbm', 'wb') as f:
+                f.write(image + '\n')
+            del read[:]
+            pdf_processor.extract_text_from_pages()
+            self.assertEqual([('one/one-000-0.pbm', 4,),], read)
+            expected = {
+                4: 'text of one/one-000-0.pbm\n',
+                5: 'text of one/one-000-a.pbm\n',
+                6: 'text of one/one-000-b.pbm\n',
+                7: 'text of two/two-000-b.pbm\n',
+                8: 'text of three/three-000-a.pbm\n',
+            }
+            for page_nbr, text in expected.items():
+                with open('text/raw/{}.txt'.format(page_nbr), 'r') as f:
+                    self.assertEqual(text, f.read())
+            # the edits go with the page
+            with open('text/clean/6.txt', 'r') as f:
+                self.assertEqual('edited\n', f.read())
+            self.assertEqual(os.path.realpath('images/cropped/one/one-000-a.pbm'),
+                os.path.realpath('images/pages/5.pbm'))
+
+            del read[:]
+            pdf_processor.extract_text_from_pages()
+            self.assertEqual([], read)
+        finally:
+            os.chdir(PATH)
+            shutil.rmtree(project)
+
     def test_extract_text(self):
         with open('/dev/null', 'wb') as f:
             if not subprocess.call(['which', 'tesseract',], stdout=f, stderr=f):
@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 
+import codecs
+import json
 import unittest
 import os
 import shutil
 import subprocess
 import sys
+import tempfile
 PATH = os.path.split(os.path.realpath(__file__))[0]
 
 import spell_checker
@@ -16,17 +19,253 @@ class SpellCheckTester(unittest.TestCase):
         sc = spell_checker.StubSpellChecker(['a','b','c','d',])
         self.assertEqual(['the', 'cat',], sc.check_line('the b cat c a d'))
 
+    def test_verdict_cache(self):
+        sc = spell_checker.StubSpellChecker(['a', 'b',])
+        self.assertEqual(['cat',], sc.check_line('a cat b'))
+        self.assertEqual(['cat', 'cat',], sc.check_line('cat a cat'))
+        hits, misses, size = sc.cache_info()
+        self.assertEqual((2, 3, 3,), (hits, misses, size,))
+        sc.correct_words.append('cat')
+        # stale until the dictionary is marked as changed
+        self.assertEqual(['cat',], sc.check_line('cat'))
+        sc.dictionary_changed()
+        self.assertEqual([], sc.check_line('cat'))
+
+    def test_check_many(self):
+        sc = spell_checker.StubSpellChecker(['a', 'b', 'xNoTPassx',])
+        self.assertEqual([True, False, True, False,], sc.check_many(['a', 'cat', 'a b', 'b cat',]))
+        self.assertEqual([u'', u'cat', u'', u'cat',], sc.failed_words(['a', 'cat', 'a b', 'b cat',]))
+        self.assertEqual((['a', 'a b',], ['cat', 'b cat',],), sc.good_and_bad(['a', 'cat', 'a b', 'b cat',]))
+        self.assertEqual([], sc.check_many([]))
+
+    def test_verdict_cache_bounded(self):
+        cache = spell_checker.VerdictCache(2)
+        cache.put('a', ())
+        cache.put('b', ())
+        cache.get('a')
+        cache.put('c', ())
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual((), cache.get('a'))
+        self.assertEqual(2, len(cache))
+
     def test_aspell(self):
         with open('/dev/null', 'wb') as f:
             if not subprocess.call(['which', 'aspell',], stdout=f, stderr=f):
                 sc = spell_checker.AspellSpellChecker('en_US')
                 self.assertEqual(['afeve', 'brff',], sorted(sc.check_line('what brff needs is an afeve in the car.')))
 
+    def test_aspell_pipe_reused(self):
+        with open('/dev/null', 'wb') as f:
+            if not subprocess.call(['which', 'aspell',], stdout=f, stderr=f):
+                sc = spell_checker.AspellSpellChecker('en_US')
+                self.assertEqual(['brff',], sc.check_line('what brff needs'))
+                process = sc.aspell_pipe.process
+                self.assertEqual([], sc.check_line(''))
+                self.assertEqual([], sc.check_line('*the car'))
+                self.assertEqual(['afeve',], sc.check_line(u'an afeve\nin the car'))
+                self.assertTrue(process is sc.aspell_pipe.process)
+                sc.close()
+                self.assertEqual(['brff',], sc.check_line('brff'))
+
+    def test_add_word(self):
+        dir_ = tempfile.mkdtemp()
+        try:
+            dict_path = '{}/dict.en.pws'.format(dir_)
+            with open(dict_path, 'wb') as f:
+                f.write('personal_ws-1.1 en 0\n')
+            sc = spell_checker.AspellSpellChecker('en_US', dict_path, dir_)
+            dict_hash = sc.dict_hash
+            sc.verdict_store.put('en_US', dict_hash, 'brff', ['brff',])
+            sc.verdict_cache.put(('en_US', sc.dict_revision, 'brff',), ('brff',))
+            self.assertEqual(['brff',], sc.check_line('brff'))
+            sc.add_word('brff')
+            with open(dict_path, 'rb') as f:
+                self.assertEqual(['personal_ws-1.1 en 0', 'brff',], f.read().splitlines())
+            self.assertNotEqual(dict_hash, sc.dict_hash)
+            self.assertEqual(None, sc.verdict_store.get('en_US', dict_hash, 'brff'))
+            self.assertEqual(None, sc.verdict_cache.get(('en_US', sc.dict_revision, 'brff',)))
+            with open('/dev/null', 'wb') as f:
+                if not subprocess.call(['which', 'aspell',], stdout=f, stderr=f):
+                    self.assertEqual([], sc.check_line('what brff needs'))
+                    sc.add_word('afeve')
+                    self.assertEqual([], sc.check_line('an afeve'))
+            sc.close()
+        finally:
+            shutil.rmtree(dir_)
+
+    def test_word_list(self):
+        dir_ = tempfile.mkdtemp()
+        try:
+            word_list = '{}/words.en.txt'.format(dir_)
+            with open(word_list, 'wb') as f:
+                f.write('burns\n')
+            sc = spell_checker.AspellSpellChecker('en_US', store_dir=None, word_list_path=word_list)
+            self.assertEqual(3, sc.prefix_index.impossible_at('bum'))
+            sc.main_dictionaries = []
+            self.assertFalse(sc.word_list_stale(word_list))
+            dumped = '{}/dumped.txt'.format(dir_)
+            self.assertTrue(sc.word_list_stale(dumped))
+            with open('/dev/null', 'wb') as f:
+                if not subprocess.call(['which', 'aspell',], stdout=f, stderr=f):
+                    self.assertTrue(sc.dump_word_list(dumped))
+                    self.assertIn('burns', spell_checker.load_word_list(dumped))
+            newer = '{}/en_US.multi'.format(dir_)
+            open(newer, 'wb').close()
+            os.utime(word_list, (0, 0,))
+            sc.main_dictionaries = [newer,]
+            self.assertTrue(sc.word_list_stale(word_list))
+        finally:
+            shutil.rmtree(dir_)
+
+    def test_word_list_personal_dictionary(self):
+        dir_ = tempfile.mkdtemp()
+        aspell_config = spell_checker.AspellSpellChecker.aspell_config
+        try:
+            word_list = '{}/words.en.txt'.format(dir_)
+            with open(word_list, 'wb') as f:
+                f.write('burns\n')
+            with open('{}/.aspell.en.pws'.format(dir_), 'wb') as f:
+                f.write('personal_ws-1.1 en 0\nbomb\n')
+            # the default personal dictionary, as when no dict_path is given
+            config = {'home-dir': dir_, 'personal': '.aspell.en.pws',}
+            spell_checker.AspellSpellChecker.aspell_config = lambda self, key: config.get(key, '')
+            sc = spell_checker.AspellSpellChecker('en', store_dir=None, word_list_path=word_list)
+            sc.log_file = '{}/automatic_fixes.log'.format(dir_)
+            self.assertTrue((u'bomb', 'bornb', u'rn-to-m') in sc.transformed_variations('bornb'))
+            with open('/dev/null', 'wb') as f:
+                if not subprocess.call(['which', 'aspell',], stdout=f, stderr=f):
+                    self.assertEqual('bomb', sc.fix_spelling('bornb'))
+            sc.close()
+        finally:
+            spell_checker.AspellSpellChecker.aspell_config = aspell_config
+            shutil.rmtree(dir_)
+
+    def test_verdict_store(self):
+        dir_ = tempfile.mkdtemp()
+        try:
+            path = '{}/spell_verdicts.db'.format(dir_)
+            store = spell_checker.VerdictStore(path, batch_size=2)
+            self.assertEqual(None, store.connection)
+            store.put('fr', '', u'caf\u00e9', [])
+            self.assertEqual(None, store.get('fr', '', u'caf\u00e9'))
+            store.put('fr', '', 'brff', ['brff',])
+            self.assertEqual([], store.get('fr', '', u'caf\u00e9'))
+            store.put('fr', 'abc', 'brff-x', ['brff', 'x',])
+            store.close()
+            store = spell_checker.VerdictStore(path)
+            self.assertEqual(['brff',], store.get('fr', '', 'brff'))
+            self.assertEqual(['brff', 'x',], store.get('fr', 'abc', 'brff-x'))
+            self.assertEqual(None, store.get('en', '', 'brff'))
+            store.close()
+            # closed before forking, it opens again when next used
+            self.assertEqual(None, store.connection)
+            self.assertEqual(['brff',], store.get('fr', '', 'brff'))
+            store.close()
+        finally:
+            shutil.rmtree(dir_)
+
+    def test_dictionary_checker(self):
+        dir_ = tempfile.mkdtemp()
+        try:
+            word_list = '{}/words.txt'.format(dir_)
+            with open(word_list, 'wb') as f:
+                f.write('the\nsay\ncar\nParis\nhe\'ll\ncaf\xc3\xa9\n')
+            dict_path = '{}/dict.en.pws'.format(dir_)
+            with open(dict_path, 'wb') as f:
+                f.write('personal_ws-1.1 en 0\nbrff\n')
+            sc = spell_checker.DictionarySpellChecker('en', word_list, dict_path)
+            self.assertEqual([], sc.check_line(u"The car, he'll say, caf\u00e9 brff."))
+            self.assertEqual(['paris', 'afeve',], sc.check_line('THE paris 12 afeve'))
+            self.assertEqual(['afeve',], sc.check_line('car-afeve'))
+            self.assertEqual(['', 'afeve', '',], sc.failed_words(['the', 'afeve', 'car.',]))
+            self.assertEqual((['car',], ['afeve',],), sc.good_and_bad(['car', 'afeve',]))
+            sc.add_word('afeve')
+            self.assertEqual([], sc.check_line('afeve'))
+            sc = spell_checker.DictionarySpellChecker('en', word_list, dict_path)
+            self.assertEqual([], sc.check_line('afeve'))
+        finally:
+            shutil.rmtree(dir_)
+
+    def test_prefix_index(self):
+        index = spell_checker.PrefixIndex(['burns', 'Paris', "he'll", 'pearl-jam',])
+        self.assertEqual(None, index.impossible_at('bur par ll jam'))
+        self.assertEqual(None, index.impossible_at(u'PARIS, 12 he'))
+        self.assertEqual(3, index.impossible_at('bum5'))
+        self.assertEqual(11, index.impossible_at('burns 5 pax'))
+        self.assertEqual(9, index.impossible_at('pearl-jax'))
+        index.add('pax')
+        self.assertEqual(None, index.impossible_at('burns 5 pax'))
+
+    def test_pruned_variations(self):
+        dir_ = tempfile.mkdtemp()
+        try:
+            word_list = '{}/words.txt'.format(dir_)
+            with open(word_list, 'wb') as f:
+                f.write('burns\nbomb\n')
+            sc = spell_checker.DictionarySpellChecker('en', word_list)
+            sc.log_file = '{}/automatic_fixes.log'.format(dir_)
+            self.assertEqual(set([(u'burns', 'burn5', u'5-to-s'),]), sc.transformed_variations('burn5'))
+            self.assertEqual('bomb', sc.fix_spelling('bornb'))
+            # pruning only drops what can't be a word
+            stub = spell_checker.StubSpellChecker(['burns', 'bomb',])
+            stub.fixer = sc.fixer
+            for word in ('bornb', 'burn5', 'rn1l0cl5', 'VVornb0',):
+                self.assertEqual(
+                    set(v for v in stub.transformed_variations(word) if not stub.check_line(v[0])),
+                    set(v for v in sc.transformed_variations(word) if not sc.check_line(v[0])))
+            sc.add_word('bums')
+            self.assertTrue((u'bums', u'bum5', u'5-to-s') in sc.transformed_variations('burn5'))
+            sc.flush()
+        finally:
+            shutil.rmtree(dir_)
+
     def test_quick_fix(self):
         sc = spell_checker.StubSpellChecker(['a','b','c','d',])
         for test, expected in test_expected('{}/test_spellcheck/quick_fix'.format(PATH)):
             self.assertEqual(sc.quick_fix(test), expected)
 
+    def test_quick_fix_lines(self):
+        sc = spell_checker.StubSpellChecker(['a','b','c','d',])
+        sc.fixer = spell_checker.EnglishSpellFixer()
+        dir_ = tempfile.mkdtemp()
+        try:
+            sc.log_file = '{}/automatic_fixes.log'.format(dir_)
+            sc.format_string = u'{} {} {} {}\n'
+            pairs = list(test_expected('{}/test_spellcheck/quick_fix'.format(PATH)))
+            pairs.extend(test_expected('{}/test_spellcheck/english_quick_fix'.format(PATH)))
+            self.assertEqual([e for t, e in pairs], sc.quick_fix_lines([t for t, e in pairs]))
+            # buffered until flushed
+            self.assertFalse(os.path.exists(sc.log_file))
+            sc.flush()
+            with open(sc.log_file, 'rb') as f:
+                logged = f.read().splitlines()
+            self.assertTrue(len(logged) >= len([t for t, e in pairs if t != e]))
+            self.assertTrue(all(l.startswith('quick_fix') for l in logged))
+        finally:
+            shutil.rmtree(dir_)
+
+    def test_json_fix_log(self):
+        dir_ = tempfile.mkdtemp()
+        try:
+            path = '{}/automatic_fixes.jsonl'.format(dir_)
+            log = spell_checker.FixLog(path, batch_size=2)
+            log.write('quick_fix', 'weird-x', u'3\xd7', '3x', ('012', 4,))
+            self.assertFalse(os.path.exists(path))
+            log.write('spell_fix', 'rn-to-m', 'bornb', 'bomb')
+            with codecs.open(path, mode='rb', encoding='utf-8') as f:
+                entries = [json.loads(l) for l in f]
+            self.assertEqual([
+                {'page': '012', 'line': 4, 'context': 'quick_fix', 'rule': 'weird-x', 'before': u'3\xd7', 'after': '3x',},
+                {'page': None, 'line': None, 'context': 'spell_fix', 'rule': 'rn-to-m', 'before': 'bornb', 'after': 'bomb',},
+            ], entries)
+            # what is left is written when the log goes away
+            log.write('spell_fix', 'rn-to-m', 'cornb', 'comb')
+            del log
+            with codecs.open(path, mode='rb', encoding='utf-8') as f:
+                self.assertEqual(3, len(f.readlines()))
+        finally:
+            shutil.rmtree(dir_)
+
     def test_english_quick_fix(self):
         sc = spell_checker.StubSpellChecker(['a','b','c','d',])
         sc.fixer = spell_checker.EnglishSpellFixer()
@@ -89,6 +328,13 @@ class SpellCheckTester(unittest.TestCase):
         expected = set([('bum5', 'burn5', u'rn-to-m'), (u'burns', 'burn5', u'5-to-s'), (u'bums', 'bum5', u'5-to-s')])
         self.assertEqual(expected, sc.transformed_variations('burn5'))
 
+    def test_letter_fix_engine(self):
+        engine = spell_checker.LetterFixEngine(spell_checker.EnglishSpellFixer().letter_fixes, max_edits=1)
+        self.assertEqual(set(['bum5', 'burns',]), set(v[0] for v in engine.variations('burn5')))
+        # callable replacements work with several matches
+        engine = spell_checker.LetterFixEngine(spell_checker.FrenchSpellFixer().letter_fixes)
+        self.assertTrue(set(['exaeXchange', 'eXaexchange',]) <= set(v[0] for v in engine.variations('eXaeXchange')))
+
     def test_proper_noun(self):
         sc = spell_checker.StubSpellChecker([])
         to_test = (
@@ -131,6 +377,23 @@ class SpellCheckTester(unittest.TestCase):
         sc = spell_checker.StubSpellChecker([])
         sc.fixer = spell_checker.FrenchSpellFixer()
         self.assertEquals(set('f'), sc.strict_check('f'))
+    def test_strict_findings(self):
+        sc = spell_checker.StubSpellChecker([])
+        sc.fixer = spell_checker.EnglishSpellFixer()
+        self.assertEqual([], sc.strict_findings(u'A perfectly good line.'))
+        self.assertEqual([
+            (r'[0-9]', 6, '3',),
+            (r'\*', 8, '*',),
+        ], sc.strict_findings(u'Under 3 ** stars'))
+        self.assertEqual([(r"\b1'", 4, "1'",)], sc.odd_punctuation_findings(u"and 1'homme"))
+        # the same as searching for each regex in turn
+        for sc.fixer in (spell_checker.EnglishSpellFixer(), spell_checker.FrenchSpellFixer(),):
+            for fixture in ('odd_punctuation', 'quick_fix', 'english_quick_fix',):
+                for test, expected in test_expected('{}/test_spellcheck/{}'.format(PATH, fixture)):
+                    old = set([m.group(0) for m in [r.search(test) for r in sc.fixer.odd_punctuation] if m])
+                    self.assertEqual(old, sc.odd_punctuation(test), test)
+                    old = set([m.group(0) for m in [r.search(test) for r in sc.fixer.strict_checks] if m])
+                    self.assertEqual(old, sc.strict_check(test), test)
     def test_garbage_stripper(self):
         words = (
             ("Julia-she", "Julia"),